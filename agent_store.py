@@ -0,0 +1,245 @@
+# Column store for the agent population: one NumPy row per agent instead of one object each
+import numpy as np
+
+# Names of the form NAME_PREFIX + str(id + 1) are derived from the row id instead of stored
+NAME_PREFIX = "Agent_"
+
+# Column name -> dtype. active is False once an agent has been removed from the market
+COLUMNS = {
+    "x": np.int32,
+    "y": np.int32,
+    "energy": np.int64,
+    "loss": np.int32,
+    "alive": np.bool_,
+    "active": np.bool_,
+    "persona": np.int16,
+}
+
+# Starting values of a new agent
+START_ENERGY = 50
+START_LOSS = 1
+START_FOOD = 50
+
+
+class AgentStore:
+    """
+    Structure-of-arrays agent population. Row i holds agent id i in NumPy columns
+    (x, y, energy, loss, alive, active, persona code), about 24 bytes per agent.
+    Rarely used per-agent fields (latest_action, latest_trade, food) and names that
+    do not follow the Agent_<id+1> pattern live in sparse dicts keyed by id.
+    Columns grow by doubling; ids are never reused.
+
+    energy_total is the running energy of agents that are active and alive. It stays
+    exact as long as energy, alive and active change through set_energy, set_alive,
+    set_active and burn (or callers adjust it themselves). energy_in counts energy
+    brought in with new agents and burned the energy lost to per-turn upkeep, so
+    energy_in - burned - energy moved to or from food should equal energy_total.
+    """
+
+    def __init__(self, capacity=16):
+        self.count = 0
+        for name, dtype in COLUMNS.items():
+            setattr(self, name, np.zeros(max(1, capacity), dtype=dtype))
+        self.personas = []  # persona code -> persona name
+        self.persona_codes = {}
+        self.custom_names = {}  # id -> name, for names not derived from the id
+        self.name_ids = {}  # name -> id, for custom names
+        self.latest_action = {}
+        self.latest_trade = {}
+        self.food = {}
+        self.energy_total = 0
+        self.energy_in = 0
+        self.burned = 0
+
+    def __len__(self):
+        return self.count
+
+    def _reserve(self, count):
+        capacity = len(self.x)
+        if count <= capacity:
+            return
+        capacity = max(1, capacity)
+        while capacity < count:
+            capacity *= 2
+        for name in COLUMNS:
+            column = getattr(self, name)
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:self.count] = column[:self.count]
+            setattr(self, name, grown)
+
+    def persona_code(self, persona):
+        code = self.persona_codes.get(persona)
+        if code is None:
+            code = self.persona_codes[persona] = len(self.personas)
+            self.personas.append(persona)
+        return code
+
+    def add(self, name, persona, x=0, y=0, energy=START_ENERGY, loss=START_LOSS, active=True):
+        """Append one agent and return its id"""
+        i = self.count
+        self._reserve(i + 1)
+        self.count += 1
+        self.x[i], self.y[i] = x, y
+        self.energy[i] = energy
+        self.loss[i] = loss
+        self.alive[i] = True
+        self.active[i] = active
+        self.persona[i] = self.persona_code(persona)
+        self.set_name(i, name)
+        if active:
+            self.energy_total += int(energy)
+            self.energy_in += int(energy)
+        return i
+
+    def add_many(self, personas, xs, ys, energy=START_ENERGY, loss=START_LOSS):
+        """Append len(xs) agents with default names; personas is one name or one per agent. Returns the ids"""
+        n = len(xs)
+        start = self.count
+        self._reserve(start + n)
+        self.count += n
+        ids = np.arange(start, start + n)
+        self.x[ids] = xs
+        self.y[ids] = ys
+        self.energy[ids] = energy
+        self.loss[ids] = loss
+        self.alive[ids] = True
+        self.active[ids] = True
+        self.energy_total += int(energy) * n
+        self.energy_in += int(energy) * n
+        if isinstance(personas, str):
+            self.persona[ids] = self.persona_code(personas)
+        else:
+            codes = {persona: self.persona_code(persona) for persona in set(personas)}
+            self.persona[ids] = np.fromiter((codes[p] for p in personas), dtype=np.int16, count=n)
+        return ids
+
+    def adopt(self, other, i):
+        """Copy agent i of another store into this one and return its new id"""
+        new = self.add(other.name(i), other.personas[other.persona[i]], other.x[i], other.y[i],
+                       other.energy[i], other.loss[i], bool(other.active[i]))
+        self.set_alive(new, bool(other.alive[i]))
+        for field in ("latest_action", "latest_trade", "food"):
+            source = getattr(other, field)
+            if i in source:
+                getattr(self, field)[new] = source[i]
+        return new
+
+    def _counted(self, i):
+        return self.active[i] and self.alive[i]
+
+    def set_energy(self, i, energy):
+        if self._counted(i):
+            self.energy_total += int(energy) - int(self.energy[i])
+        self.energy[i] = energy
+
+    def set_alive(self, i, alive):
+        if self.active[i] and self.alive[i] != alive:
+            self.energy_total += int(self.energy[i]) if alive else -int(self.energy[i])
+        self.alive[i] = alive
+
+    def set_active(self, i, active):
+        if self.alive[i] and self.active[i] != active:
+            self.energy_total += int(self.energy[i]) if active else -int(self.energy[i])
+        self.active[i] = active
+
+    def burn(self, ids):
+        """
+        Apply one turn of upkeep to the given living agents: energy drops by each
+        agent's loss and agents left at 0 or below die. Returns the alive mask.
+        """
+        old = self.energy[ids]
+        losses = self.loss[ids]
+        new = old - losses
+        alive = new > 0
+        self.energy[ids] = new
+        self.alive[ids] = alive
+        self.burned += int(np.minimum(losses, np.maximum(old, 0)).sum())
+        self.energy_total += int(new[alive].sum()) - int(old.sum())
+        return alive
+
+    def recount_energy(self):
+        """Full recount of what energy_total should be"""
+        return int(self.energy[self.living_ids()].sum())
+
+    def name(self, i):
+        name = self.custom_names.get(i)
+        return name if name is not None else f"{NAME_PREFIX}{i + 1}"
+
+    def set_name(self, i, name):
+        old = self.custom_names.pop(i, None)
+        if old is not None and self.name_ids.get(old) == i:
+            del self.name_ids[old]
+            # Names need not be unique; find() then returns another agent that has it
+            for j, other in self.custom_names.items():
+                if other == old:
+                    self.name_ids[old] = j
+                    break
+        if name != f"{NAME_PREFIX}{i + 1}":
+            self.custom_names[i] = name
+            self.name_ids[name] = i
+
+    def find(self, name):
+        """Id of the agent called name, or None"""
+        i = self.name_ids.get(name)
+        if i is not None:
+            return i
+        if name.startswith(NAME_PREFIX) and name[len(NAME_PREFIX):].isdigit():
+            i = int(name[len(NAME_PREFIX):]) - 1
+            if 0 <= i < self.count and i not in self.custom_names:
+                return i
+        return None
+
+    def active_ids(self):
+        """Ids of agents still in the market, in the order they were added"""
+        return np.flatnonzero(self.active[:self.count])
+
+    def living_ids(self):
+        """Ids of agents in the market that are alive"""
+        n = self.count
+        return np.flatnonzero(self.active[:n] & self.alive[:n])
+
+    def nbytes(self):
+        """Bytes held by the columns (excluding the sparse per-agent dicts)"""
+        return sum(getattr(self, name).nbytes for name in COLUMNS)
+
+    def __getstate__(self):
+        # Drop unused capacity so checkpoints only hold real rows
+        state = self.__dict__.copy()
+        for name in COLUMNS:
+            state[name] = getattr(self, name)[:self.count].copy()
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+
+class AgentColumns:
+    """
+    Read-only copy of the columns of the agents in the market (active rows, in id
+    order) plus their names and latest trades: what the visualization draws, taken
+    in one pass of NumPy copies so the UI thread never touches the live store.
+    """
+
+    def __init__(self, store):
+        ids = store.active_ids()
+        self.ids = ids
+        self.x = store.x[ids]
+        self.y = store.y[ids]
+        self.energy = store.energy[ids]
+        self.alive = store.alive[ids]
+        self.persona = store.persona[ids]
+        for column in (self.ids, self.x, self.y, self.energy, self.alive, self.persona):
+            column.flags.writeable = False
+        self.personas = tuple(store.personas)
+        self.custom_names = dict(store.custom_names)
+        # Latest trade of each agent that has one, in id order
+        self.latest_trade = {i: dict(store.latest_trade[i]) for i in sorted(store.latest_trade)
+                             if store.active[i]}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def name(self, i):
+        """Name of agent id i (an entry of ids, not a position in the columns)"""
+        name = self.custom_names.get(i)
+        return name if name is not None else f"{NAME_PREFIX}{i + 1}"
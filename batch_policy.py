@@ -0,0 +1,167 @@
+# Vectorized batch policies for rule-based (non-LLM) runs
+import numpy as np
+from flow_field import FlowField, UNREACHABLE
+from market import RED_FOOD_ENERGY, GREEN_FOOD_ENERGY
+
+# Action codes shared by all batch policies
+WAIT, MOVE_UP, MOVE_DOWN, MOVE_LEFT, MOVE_RIGHT, GATHER = range(6)
+ACTION_NAMES = ["WAIT", "MOVE UP", "MOVE DOWN", "MOVE LEFT", "MOVE RIGHT", "GATHER"]
+MOVE_ACTIONS = np.array([MOVE_UP, MOVE_DOWN, MOVE_LEFT, MOVE_RIGHT])
+
+# Position change per action code
+ACTION_DX = np.array([0, 0, 0, -1, 1, 0])
+ACTION_DY = np.array([0, -1, 1, 0, 0, 0])
+
+
+class BatchPolicy:
+    """
+    Decides actions for every living agent at once.
+    Subclasses implement decide() over NumPy arrays instead of one prompt per agent.
+    """
+
+    def decide(self, market, xs, ys, energies):
+        """Return an int array of action codes, one per agent"""
+        raise NotImplementedError
+
+
+class RandomBatchPolicy(BatchPolicy):
+    """
+    Vectorized counterpart of the mock call_gemini: picks uniformly among the four
+    moves and GATHER, optionally gathering more often when standing on food
+    """
+
+    def __init__(self, gather_bias=0.0, seed=None):
+        self.gather_bias = gather_bias
+        self.rng = np.random.default_rng(seed)
+        self.choices = np.append(MOVE_ACTIONS, GATHER)
+
+    def decide(self, market, xs, ys, energies):
+        actions = self.rng.choice(self.choices, size=len(xs))
+        if self.gather_bias > 0:
+            on_food = market.food[:, ys, xs].any(axis=0)
+            biased = on_food & (self.rng.random(len(xs)) < self.gather_bias)
+            actions[biased] = GATHER
+        return actions
+
+
+class GreedyBatchPolicy(BatchPolicy):
+    """
+    Gathers when standing on food, otherwise steps toward the richest of the four
+    neighbouring cells. Explores randomly when no neighbour holds food.
+    """
+
+    def __init__(self, seed=None):
+        self.rng = np.random.default_rng(seed)
+
+    def decide(self, market, xs, ys, energies):
+        value = market.red_food * RED_FOOD_ENERGY + market.green_food * GREEN_FOOD_ENERGY
+        # Pad with -1 so moving off the board is never the best option
+        padded = np.pad(value, 1, constant_values=-1)
+        px, py = xs + 1, ys + 1
+        neighbours = np.stack([
+            padded[py - 1, px],  # UP
+            padded[py + 1, px],  # DOWN
+            padded[py, px - 1],  # LEFT
+            padded[py, px + 1],  # RIGHT
+        ], axis=1)
+
+        actions = MOVE_ACTIONS[neighbours.argmax(axis=1)]
+        no_food = neighbours.max(axis=1) <= 0
+        actions[no_food] = self.rng.choice(MOVE_ACTIONS, size=int(no_food.sum()))
+        actions[value[ys, xs] > 0] = GATHER
+        return actions
+
+
+class FlowFieldBatchPolicy(BatchPolicy):
+    """
+    Gathers when standing on food, otherwise steps toward the nearest food anywhere
+    on the board, following a FlowField that the market keeps current as food is
+    gathered and replenished. Each agent's move is four O(1) distance lookups.
+    Explores randomly only when there is no food at all.
+    """
+
+    def __init__(self, seed=None):
+        self.rng = np.random.default_rng(seed)
+        self.field = None
+
+    def _field_for(self, market):
+        if self.field is None or self.field.market is not market:
+            if self.field is not None:
+                self.field.market.remove_food_listener(self.field._food_changed)
+            self.field = FlowField(market)
+        else:
+            self.field.update()
+        return self.field
+
+    def decide(self, market, xs, ys, energies):
+        field = self._field_for(market)
+        here = field.distance_at(xs, ys)
+        neighbours = field.neighbour_distances(xs, ys)
+        # Distances are whole steps, so noise below 1 only breaks ties between equally
+        # short moves, which keeps agents chasing the same food from moving in lockstep
+        noisy = neighbours + self.rng.random(neighbours.shape) * 0.5
+        actions = MOVE_ACTIONS[noisy.argmin(axis=1)]
+        lost = here == UNREACHABLE
+        actions[lost] = self.rng.choice(MOVE_ACTIONS, size=int(lost.sum()))
+        actions[here == 0] = GATHER
+        return actions
+
+    def __getstate__(self):
+        # The field is derived from the market it follows; rebuild it after a restore
+        state = self.__dict__.copy()
+        state["field"] = None
+        return state
+
+
+# Rule-based policies available to headless runs by name; "llm" keeps per-agent decide_action
+BATCH_POLICIES = {
+    "random": RandomBatchPolicy,
+    "greedy": GreedyBatchPolicy,
+    "flow": FlowFieldBatchPolicy,
+}
+
+
+def agent_arrays(store, ids):
+    """Gather positions, energies and loss rates of the given agent ids as int64 arrays"""
+    return (store.x[ids].astype(np.int64), store.y[ids].astype(np.int64),
+            store.energy[ids], store.loss[ids].astype(np.int64))
+
+
+def batch_lose_energy(store):
+    """Deduct per-turn energy loss from all living agents in the store at once. Returns the death count"""
+    ids = store.living_ids()
+    if not len(ids):
+        return 0
+    alive = store.burn(ids)
+    return len(ids) - int(alive.sum())
+
+
+def batch_execute(market, ids, actions, xs, ys, energies):
+    """
+    Apply moves and gathers for the agents with the given ids in one pass, writing
+    straight to the market's agent columns. Each agent either moves or gathers, so
+    only gatherers sharing a cell conflict; the first of them in id order takes the
+    food, as in the sequential loop. Returns the total energy gathered.
+    """
+    new_xs = np.clip(xs + ACTION_DX[actions], 0, market.width - 1)
+    new_ys = np.clip(ys + ACTION_DY[actions], 0, market.height - 1)
+
+    gathered = 0
+    gatherers = np.flatnonzero(actions == GATHER)
+    if len(gatherers):
+        cells = ys[gatherers] * market.width + xs[gatherers]
+        _, first = np.unique(cells, return_index=True)
+        winners = gatherers[first]
+        wx, wy = xs[winners], ys[winners]
+        gains = market.red_food[wy, wx] * RED_FOOD_ENERGY + market.green_food[wy, wx] * GREEN_FOOD_ENERGY
+        market.food[:, wy, wx] = 0
+        gathered = int(gains.sum())
+        market.store.energy[ids[winners]] = energies[winners] + gains
+        # Energy moves from the food to the agents
+        market.food_energy -= gathered
+        market.store.energy_total += gathered
+        market.food_changed(cells[first])
+
+    moved = np.flatnonzero((new_xs != xs) | (new_ys != ys))
+    market.relocate_agents(ids[moved], new_xs[moved], new_ys[moved])
+    return gathered
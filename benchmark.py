@@ -0,0 +1,359 @@
+# benchmark.py - Offline timing of the simulation's hot paths, with regression checks against a baseline
+import argparse
+import itertools
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+# Benchmarks never open a window or touch the sound card
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import numpy as np
+import llm_model
+from market import RED_FOOD_ENERGY
+from simulation import create_simulation
+from batch_policy import GreedyBatchPolicy
+
+RESULTS_VERSION = 1
+
+DEFAULT_SIZES = [9, 100, 1000]
+DEFAULT_AGENTS = [4, 1000, 100000]
+QUICK_SIZES = [9, 100]
+QUICK_AGENTS = [4, 1000]
+
+# A result slower than baseline * (1 + DEFAULT_THRESHOLD) counts as a regression
+DEFAULT_THRESHOLD = 0.25
+
+# Replies parse_action is timed on: XML and JSON moves, gathers and trade offers, and an unparseable one
+SAMPLE_RESPONSES = [
+    "<ACTION>\nMOVE UP\n</ACTION>",
+    '{"action": "MOVE", "direction": "LEFT"}',
+    '{"action": "TRADE", "amount": 10, "to": "Agent_2"}',
+    "Food is here, so I will gather it.\n<ACTION>\nGATHER\n</ACTION>",
+    "<TRADE_OFFER>\noffer: 10 energy\nto: Agent_2\n</TRADE_OFFER>",
+    "I am not sure what to do.",
+]
+
+
+def build_simulation(size, agents, policy=None):
+    """A seeded, silent simulation whose agents have enough energy to outlive any benchmark"""
+    llm_model.seed_mock(0)
+    sim = create_simulation(width=size, height=size, personas=["Risk-averse"] * agents, seed=0,
+                            verbose=False, policy=policy)
+    store = sim.market.store
+    store.energy[:store.count] = 10 ** 9
+    store.energy_total = store.recount_energy()
+    return sim
+
+
+def first_agent(market):
+    return market.agents[0]
+
+
+def bench_nearby_agents(size, agents):
+    market = build_simulation(size, agents).market
+    agent = first_agent(market)
+    return lambda: market.nearby_agents(agent), None
+
+
+def bench_nearby_market_context(size, agents):
+    market = build_simulation(size, agents).market
+    agent = first_agent(market)
+    return lambda: market.nearby_market_context(agent), None
+
+
+def bench_gather_resources(size, agents):
+    market = build_simulation(size, agents).market
+    agent = first_agent(market)
+    x, y = agent.position
+
+    def put_food():
+        market.red_food[y, x] += 1
+        market.food_energy += RED_FOOD_ENERGY
+        market.food_in += RED_FOOD_ENERGY
+    return lambda: market.gather_resources(agent), put_food
+
+
+def bench_replenish_resources(size, agents):
+    market = build_simulation(size, agents).market
+    return market.replenish_resources, None
+
+
+def bench_get_total_system_energy(size, agents):
+    market = build_simulation(size, agents).market
+    return market.get_total_system_energy, None
+
+
+def bench_decide_action(size, agents):
+    market = build_simulation(size, agents).market
+    agent = first_agent(market)
+    return lambda: agent.decide_action(market), None
+
+
+def bench_parse_action(size, agents):
+    market = build_simulation(size, agents).market
+    agent = first_agent(market)
+    responses = itertools.cycle(SAMPLE_RESPONSES)
+    return lambda: agent.parse_action(next(responses)), None
+
+
+def bench_step_llm(size, agents):
+    """One full headless step on the per-agent path, with the mock model answering"""
+    sim = build_simulation(size, agents)
+    return sim.step, None
+
+
+def bench_step_greedy(size, agents):
+    """One full headless step with the vectorized greedy policy"""
+    sim = build_simulation(size, agents, policy=GreedyBatchPolicy(seed=0))
+    return sim.step, None
+
+
+def bench_visualization_update(size, agents):
+    """Visualization.update after a replenishment, i.e. the incremental redraw of a live frame"""
+    from visualization import Visualization
+    market = build_simulation(size, agents).market
+    vis = Visualization(width=size, height=size)
+    vis.update(market)
+    return lambda: vis.update(market), market.replenish_resources
+
+
+def bench_visualization_full_redraw(size, agents):
+    from visualization import Visualization
+    market = build_simulation(size, agents).market
+    vis = Visualization(width=size, height=size)
+    return lambda: vis.update(market), vis.invalidate
+
+
+# Name -> module whose import is timed in a fresh interpreter. These run once each, not
+# per size and agent count, and are recorded with size and agents 0.
+IMPORT_BENCHMARKS = {
+    "import_main": "main",
+    "import_simulation": "simulation",
+    "import_experiment_worker": "experiments, simulation, batch_policy, replenish",
+    "import_visualization": "visualization",
+}
+
+IMPORT_TIMER = "import time; start = time.perf_counter(); import {}; print(time.perf_counter() - start)"
+
+
+def measure_import(modules, runs=5):
+    """Seconds taken to import modules in each of `runs` fresh interpreters (startup itself excluded)"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    times = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", IMPORT_TIMER.format(modules)], cwd=here,
+                                capture_output=True, text=True, check=True).stdout
+        times.append(float(output.strip().splitlines()[-1]))
+    return times
+
+
+# Name -> setup(size, agents) returning (timed callable, untimed callable run before each call or None)
+BENCHMARKS = {
+    "nearby_agents": bench_nearby_agents,
+    "nearby_market_context": bench_nearby_market_context,
+    "gather_resources": bench_gather_resources,
+    "replenish_resources": bench_replenish_resources,
+    "get_total_system_energy": bench_get_total_system_energy,
+    "decide_action": bench_decide_action,
+    "parse_action": bench_parse_action,
+    "step_llm": bench_step_llm,
+    "step_greedy": bench_step_greedy,
+    "visualization_update": bench_visualization_update,
+    "visualization_full_redraw": bench_visualization_full_redraw,
+}
+
+
+# Name -> (max agents, max agents per cell) for benchmarks whose cost grows with the
+# agent count or with how many agents share a neighbourhood; None means no limit.
+# Larger cases are skipped and reported rather than run: every prompt lists the
+# agents nearby, so on a crowded board one call takes seconds and a per-agent step hours.
+CASE_LIMITS = {
+    "nearby_agents": (None, 20),
+    "decide_action": (None, 20),
+    "step_llm": (1000, 20),
+    "visualization_update": (None, 20),
+    "visualization_full_redraw": (None, 20),
+}
+
+
+def skip_reason(name, size, agents):
+    """Why the (name, size, agents) case is not run, or None if it is"""
+    max_agents, max_density = CASE_LIMITS.get(name, (None, None))
+    if max_agents is not None and agents > max_agents:
+        return f"more than {max_agents} agents"
+    if max_density is not None and agents > max_density * size * size:
+        return f"more than {max_density} agents per cell"
+    return None
+
+
+def measure(fn, prepare=None, min_time=0.2, max_calls=10000):
+    """
+    Call fn until min_time seconds have been spent in it or max_calls calls were made
+    (at least once), timing each call on its own. Returns per-call seconds. One untimed
+    call goes first, so one-off work such as a lazy index rebuild is not measured.
+    """
+    if prepare is not None:
+        prepare()
+    fn()
+    times = []
+    spent = 0.0
+    while not times or (spent < min_time and len(times) < max_calls):
+        if prepare is not None:
+            prepare()
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        times.append(elapsed)
+        spent += elapsed
+    return times
+
+
+def make_result(name, size, agents, times):
+    return {
+        "name": name,
+        "size": size,
+        "agents": agents,
+        "calls": len(times),
+        "median": statistics.median(times),
+        "mean": statistics.fmean(times),
+        "min": min(times),
+    }
+
+
+def run_benchmarks(names, sizes, agent_counts, min_time=0.2, max_calls=10000, progress=None, skipped=None):
+    """
+    Run every named benchmark at every size and agent count (import benchmarks once),
+    except the cases CASE_LIMITS rules out. Returns a list of result dicts; skipped
+    cases are passed to skipped(name, size, agents, reason) if given
+    """
+    results = []
+    for name in names:
+        if name in IMPORT_BENCHMARKS:
+            cases = [(0, 0, lambda: measure_import(IMPORT_BENCHMARKS[name]))]
+        else:
+            cases = [(size, agents, lambda size=size, agents=agents: measure(
+                *BENCHMARKS[name](size, agents), min_time, max_calls))
+                for size in sizes for agents in agent_counts]
+        for size, agents, run in cases:
+            reason = skip_reason(name, size, agents)
+            if reason is not None:
+                if skipped is not None:
+                    skipped(name, size, agents, reason)
+                continue
+            result = make_result(name, size, agents, run())
+            results.append(result)
+            if progress is not None:
+                progress(result)
+    return results
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Match results to baseline results by (name, size, agents) and add "baseline" (its
+    median) and "ratio" (median / baseline median) to each matched result. Returns the
+    results slower than baseline by more than threshold.
+    """
+    previous = {(r["name"], r["size"], r["agents"]): r for r in baseline["results"]}
+    regressions = []
+    for result in results:
+        old = previous.get((result["name"], result["size"], result["agents"]))
+        if old is None or old["median"] <= 0:
+            continue
+        result["baseline"] = old["median"]
+        result["ratio"] = result["median"] / old["median"]
+        if result["ratio"] > 1 + threshold:
+            regressions.append(result)
+    return regressions
+
+
+def format_seconds(seconds):
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.1f}µs"
+    if seconds < 1:
+        return f"{seconds * 1e3:.2f}ms"
+    return f"{seconds:.2f}s"
+
+
+def print_result(result):
+    line = (f"{result['name']:<26} size={result['size']:<5} agents={result['agents']:<7} "
+            f"median {format_seconds(result['median']):>9}  min {format_seconds(result['min']):>9}  "
+            f"({result['calls']} calls)")
+    if "ratio" in result:
+        line += f"  x{result['ratio']:.2f} vs baseline"
+    print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the simulation's hot paths offline (mock model, no window)")
+    names = list(IMPORT_BENCHMARKS) + list(BENCHMARKS)
+    parser.add_argument("--benchmarks", nargs="+", choices=names, default=names,
+                        help="Benchmarks to run (default: all)")
+    parser.add_argument("--sizes", type=int, nargs="+", help=f"Grid sizes (default: {DEFAULT_SIZES})")
+    parser.add_argument("--agents", type=int, nargs="+", help=f"Agent counts (default: {DEFAULT_AGENTS})")
+    parser.add_argument("--quick", action="store_true",
+                        help=f"Only sizes {QUICK_SIZES} and agent counts {QUICK_AGENTS}")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Seconds to spend timing each case")
+    parser.add_argument("--max-calls", type=int, default=10000, help="Most calls timed per case")
+    parser.add_argument("--output", help="Write the results to this JSON file (usable later as --baseline)")
+    parser.add_argument("--baseline", help="Compare against results saved earlier with --output")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Slowdown over the baseline median that counts as a regression (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+    # Fallback warnings from deliberately unparseable replies would drown the report
+    logging.basicConfig(level=logging.ERROR, format="%(message)s")
+
+    sizes = args.sizes or (QUICK_SIZES if args.quick else DEFAULT_SIZES)
+    agent_counts = args.agents or (QUICK_AGENTS if args.quick else DEFAULT_AGENTS)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    print(f"⏱️ Running {len(args.benchmarks)} benchmarks over sizes {sizes} and agent counts {agent_counts}")
+    regressions = []
+
+    def report(result):
+        if baseline is not None:
+            regressions.extend(compare([result], baseline, args.threshold))
+        print_result(result)
+
+    def skip(name, size, agents, reason):
+        print(f"{name:<26} size={size:<5} agents={agents:<7} skipped ({reason})")
+
+    results = run_benchmarks(args.benchmarks, sizes, agent_counts, args.min_time, args.max_calls, report, skip)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"version": RESULTS_VERSION, "environment": environment(), "results": results}, f, indent=2)
+        print(f"💾 Results written to {args.output}")
+
+    if baseline is not None:
+        if regressions:
+            print(f"\n🐢 {len(regressions)} regression(s) over {args.threshold:.0%}:")
+            for result in regressions:
+                print_result(result)
+            return 1
+        print(f"\n✅ No regressions over {args.threshold:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,167 @@
+# Checkpoint/restore of a whole simulation, and replay of a recorded run from its decision log
+import copy
+import os
+import pickle
+import llm_model
+import prompts
+from market import Market
+from simulation import Simulation
+
+CHECKPOINT_VERSION = 5
+
+def capture_state(sim, include_log=True):
+    """
+    Everything needed to continue sim exactly where it is: the market grid and RNG,
+    the agent store, trade history, step counter, policy (with its RNG), the mock model RNG,
+    cached LLM responses and, if include_log, the decision log.
+    """
+    market = sim.market
+    cache = llm_model.response_cache
+    return {
+        "version": CHECKPOINT_VERSION,
+        "market": {
+            "width": market.width,
+            "height": market.height,
+            "seed": market.seed,
+            "energy_per_turn": market.total_energy_added_per_turn,
+            "food": market.food.copy(),
+            "food_energy": market.food_energy,
+            "food_in": market.food_in,
+            "rng": market.rng.getstate(),
+            "np_rng": market.np_rng.bit_generator.state,
+            "replenisher": copy.deepcopy(market.replenisher),
+            "red_share": market.red_share,
+            "replenish_leftover": market.replenish_leftover,
+            "trade_history": list(market.trade_history),
+            "trade_history_limit": getattr(market.trade_history, "maxlen", None),
+            "trade_count": market.trade_count,
+            "agent_count": market.agent_count,
+        },
+        "agents": copy.deepcopy(market.store),
+        "simulation": {
+            "step_count": sim.step_count,
+            "finished": sim.finished,
+            "replenish_interval": sim.replenish_interval,
+            "stats_interval": sim.stats_interval,
+            "max_concurrency": sim.max_concurrency,
+            "batch_size": sim.batch_size,
+            "policy": copy.deepcopy(sim.policy),
+        },
+        "mock_rng": llm_model.mock_rng.getstate(),
+        "response_format": prompts.response_format,
+        "cache_entries": cache.entries() if cache is not None else None,
+        "decisions": llm_model.decision_log if include_log else None,
+    }
+
+
+def restore_simulation(state, **kwargs):
+    """Rebuild a Simulation from capture_state output; kwargs override Simulation settings"""
+    if state.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(f"Unsupported checkpoint version {state.get('version')}")
+
+    saved = state["market"]
+    market = Market(width=saved["width"], height=saved["height"], seed=saved["seed"],
+                    energy_per_turn=saved["energy_per_turn"],
+                    trade_history_limit=saved["trade_history_limit"],
+                    replenisher=copy.deepcopy(saved["replenisher"]), red_share=saved["red_share"])
+    market.food[...] = saved["food"]
+    market.food_energy = saved["food_energy"]
+    market.food_in = saved["food_in"]
+    market.rng.setstate(saved["rng"])
+    market.np_rng.bit_generator.state = saved["np_rng"]
+    market.replenish_leftover = saved["replenish_leftover"]
+    market.trade_history.extend(saved["trade_history"])
+    market.trade_count = saved["trade_count"]
+
+    # Agents come back as a copy of the store columns; the spatial index is rebuilt on first use
+    market.store = copy.deepcopy(state["agents"])
+    market.agent_count = saved["agent_count"]
+    market._index_stale = True
+
+    settings = dict(state["simulation"])
+    settings["policy"] = copy.deepcopy(settings["policy"])
+    step_count = settings.pop("step_count")
+    finished = settings.pop("finished")
+    settings.update(kwargs)
+    sim = Simulation(market, **settings)
+    sim.step_count = step_count
+    sim.finished = finished
+
+    llm_model.mock_rng.setstate(state["mock_rng"])
+    # Replayed decisions are keyed by their instructions, so the format must match the recording
+    prompts.set_response_format(state["response_format"])
+    entries = state["cache_entries"]
+    if entries:
+        cache = llm_model.response_cache
+        if cache is None:
+            cache = llm_model.enable_cache(max_entries=max(10000, len(entries)))
+        cache.load_entries(entries)
+    return sim
+
+
+def save_checkpoint(sim, path):
+    """Write sim's state to path; the file is replaced atomically so a crash never leaves half a checkpoint"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(capture_state(sim), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path, **kwargs):
+    """
+    Restore a Simulation saved by save_checkpoint. If the checkpoint carries a decision
+    log it is installed again, so the resumed run keeps recording into it.
+    """
+    with open(path, "rb") as f:
+        state = pickle.load(f)
+    sim = restore_simulation(state, **kwargs)
+    log = state["decisions"]
+    if log is not None:
+        log.replaying = False
+        log.truncate(sim.step_count)
+        llm_model.set_decision_log(log)
+    return sim
+
+
+def start_recording(sim):
+    """Start logging every model response, remembering sim's current state as the replay start"""
+    log = llm_model.DecisionLog()
+    log.initial_state = capture_state(sim, include_log=False)
+    return llm_model.set_decision_log(log)
+
+
+def replay(path, **kwargs):
+    """
+    Re-run the recorded run in checkpoint path from its initial state, answering every
+    model call from the decision log. No model is called; a prompt that was not logged
+    raises CacheMissError. Returns (simulation, steps run).
+    """
+    with open(path, "rb") as f:
+        state = pickle.load(f)
+    log = state["decisions"]
+    if log is None or log.initial_state is None:
+        raise ValueError(f"{path} has no recorded decision log to replay")
+
+    sim = restore_simulation(log.initial_state, **kwargs)
+    log.replaying = True
+    llm_model.set_decision_log(log)
+    try:
+        steps = sim.run(state["simulation"]["step_count"] - sim.step_count)
+    finally:
+        llm_model.set_decision_log(None)
+    return sim, steps
+
+
+def run_with_checkpoints(sim, max_steps, path, every=25):
+    """
+    sim.run(max_steps), saving a checkpoint to path every `every` steps and at the end.
+    A crash mid-step leaves the last complete checkpoint in place to resume from.
+    """
+    steps_run = 0
+    while steps_run < max_steps:
+        steps = sim.run(min(every, max_steps - steps_run))
+        steps_run += steps
+        save_checkpoint(sim, path)
+        if sim.finished:
+            break
+    return steps_run
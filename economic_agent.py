@@ -1,121 +1,142 @@
 # Simplified economic agent with basic decision-making
-import yaml
-from llm_model import call_gemini
-import re
+from llm_model import call_gemini, mock_rng
+from prompts import decision_instructions, trade_instructions, encode_decision_state, encode_trade_state
+from agent_store import AgentStore, START_FOOD
+import protocol
+import logging
+
+logger = logging.getLogger(__name__)
 
 class EconomicAgent:
+    """
+    A view of one row of an AgentStore: every attribute reads and writes the store's
+    columns, so the object itself is just (store, id). A new agent starts in a private
+    one-row store and moves into the market's store when Market.add_agent adopts it.
+    """
+    __slots__ = ("store", "id")
+
     def __init__(self, name, persona):
-        self.name = name
-        self.persona = persona
-        self.position = (0, 0)
-        self.food = 50
-        self.latest_action = None
-        self.latest_trade = None
-        self.energy = 50  # Changed from food to energy, starting with 50 energy
-        self.energy_loss_per_turn = 1  # Fixed energy consumption per turn
-        self.is_alive = True  # Track if agent is alive
+        # Starts with 50 energy, loses 1 per turn and is alive
+        self.store = AgentStore(capacity=1)
+        self.id = self.store.add(name, persona)
+
+    @classmethod
+    def bind(cls, store, i):
+        """View of agent i in store, without creating a new agent"""
+        agent = cls.__new__(cls)
+        agent.store = store
+        agent.id = i
+        return agent
+
+    def __eq__(self, other):
+        return isinstance(other, EconomicAgent) and self.store is other.store and self.id == other.id
+
+    def __hash__(self):
+        return hash((id(self.store), self.id))
+
+    def __repr__(self):
+        return f"<EconomicAgent {self.name} at {self.position}>"
+
+    @property
+    def name(self):
+        return self.store.name(self.id)
+
+    @name.setter
+    def name(self, value):
+        self.store.set_name(self.id, value)
+
+    @property
+    def persona(self):
+        return self.store.personas[self.store.persona[self.id]]
+
+    @persona.setter
+    def persona(self, value):
+        self.store.persona[self.id] = self.store.persona_code(value)
+
+    @property
+    def position(self):
+        return (int(self.store.x[self.id]), int(self.store.y[self.id]))
+
+    @position.setter
+    def position(self, value):
+        self.store.x[self.id], self.store.y[self.id] = value
+
+    @property
+    def energy(self):
+        return int(self.store.energy[self.id])
+
+    @energy.setter
+    def energy(self, value):
+        self.store.set_energy(self.id, value)
+
+    @property
+    def energy_loss_per_turn(self):
+        return int(self.store.loss[self.id])
+
+    @energy_loss_per_turn.setter
+    def energy_loss_per_turn(self, value):
+        self.store.loss[self.id] = value
+
+    @property
+    def is_alive(self):
+        return bool(self.store.alive[self.id])
+
+    @is_alive.setter
+    def is_alive(self, value):
+        self.store.set_alive(self.id, value)
+
+    @property
+    def food(self):
+        return self.store.food.get(self.id, START_FOOD)
+
+    @food.setter
+    def food(self, value):
+        self.store.food[self.id] = value
+
+    @property
+    def latest_action(self):
+        return self.store.latest_action.get(self.id)
+
+    @latest_action.setter
+    def latest_action(self, value):
+        self.store.latest_action[self.id] = value
+
+    @property
+    def latest_trade(self):
+        return self.store.latest_trade.get(self.id)
+
+    @latest_trade.setter
+    def latest_trade(self, value):
+        self.store.latest_trade[self.id] = value
 
 
     def lose_energy_per_turn(self):
         """Called each turn to deduct energy. Agent dies if energy <= 0"""
         if self.is_alive:
-            self.energy -= self.energy_loss_per_turn
-            if self.energy <= 0:
-                self.is_alive = False
-                print(f"💀 {self.name} has died from lack of energy!")
+            if not self.store.burn([self.id])[0]:
+                logger.info("💀 %s has died from lack of energy!", self.name)
     
     def decide_action(self, market):
         # Skip decision if agent is dead
         if not self.is_alive:
             return {"type": "ACTION", "action": "DEAD"}, "Agent is dead"
         
+        # Call Gemini and parse the response
+        response = call_gemini(self.build_decision_prompt(market), decision_instructions())
+        return self.apply_decision(response), response
+
+    def build_decision_prompt(self, market):
+        """Build the per-step state prompt; the static rules go in decision_instructions()"""
         # Get context about nearby resources and agents
         market_context = market.nearby_market_context(self)
         nearby_agents = market.nearby_agents(self)
-        
-        # Format YAML for agent state and context
-        agent_yaml = yaml.dump({
-            "name": self.name,
-            "position": self.position,
-            "energy": self.energy,  # Changed from food
-            "energy_loss_per_turn": self.energy_loss_per_turn,
-            "persona": self.persona
-        }, sort_keys=False)
-        
-        
-        # Update market context to show red and green food
-        market_yaml = yaml.dump({
-            str(pos): {
-                "red_food": resources["red_food"], 
-                "green_food": resources["green_food"]
-            } for pos, resources in market_context.items() 
-            if resources["red_food"] > 0 or resources["green_food"] > 0
-        }, sort_keys=False)
-        
+        return encode_decision_state(self, market_context, nearby_agents, market.width, market.height)
 
-        nearby_agents_yaml = yaml.dump({
-            a.name: {
-                "position": a.position,
-                "energy": a.energy,  # Changed from food
-                "persona": a.persona
-            } for a in nearby_agents if a.is_alive
-        }, sort_keys=False) if nearby_agents else "None"
-        
-        # Build the prompt for Gemini
-        prompt = f"""
-            You are an economic agent in a 9x9 grid simulation with an ENERGY SYSTEM.
-
-            Your Profile:
-            {agent_yaml}
-
-            ENERGY RULES:
-            - You lose {self.energy_loss_per_turn} energy every turn
-            - You DIE if your energy reaches 0 or below
-            - Red food gives 50 energy when gathered
-            - Green food gives 5 energy when gathered
-
-            Nearby Market Cells With Food:
-            {market_yaml}
-
-            Nearby Agents:
-            {nearby_agents_yaml}
-
-            CRITICAL: You must maintain your energy above 0 to survive! Prioritize gathering food if your energy is low.
-
-            Available Actions:
-            - MOVE UP / MOVE DOWN / MOVE LEFT / MOVE RIGHT (Choose a direction toward food)
-            - GATHER (Use this when you are on a cell with red_food or green_food)
-            - WAIT (Only use if no other action makes sense)
-
-            If there's a nearby agent and you want to trade energy, respond with:
-            <TRADE_OFFER>
-            offer: [amount] energy
-            to: [agent_name]
-            </TRADE_OFFER>
-
-            Otherwise, respond with:
-            <ACTION>
-            [YOUR_ACTION_HERE]
-            </ACTION>
-
-            STRATEGY HINTS:
-            - If you see red food (50 energy), prioritize it over green food (5 energy)
-            - If your energy is below 10, focus entirely on survival - find food immediately
-            - If you don't see any food nearby, MOVE in a direction to explore
-            - Consider your energy loss rate when making decisions
-            """
-        
-        # Call Gemini and parse the response
-        response = call_gemini(prompt)
-        decision = self.parse_action(response)
-        self.latest_action = decision
-        return decision, response
-        
-        # Call Gemini and parse the response
-        response = call_gemini(prompt)
+    def apply_decision(self, response):
+        """Parse a model response into a decision and remember it as the latest action"""
         decision = self.parse_action(response)
         self.latest_action = decision
-        return decision, response
+        return decision
     
     def parse_action(self, response_text):
         """
@@ -123,80 +144,40 @@ class EconomicAgent:
         Returns a dictionary with the parsed action.
         """
         try:
-            if "<TRADE_OFFER>" in response_text:
-                trade_match = re.search(r"<TRADE_OFFER>(.*?)</TRADE_OFFER>", response_text, re.DOTALL)
-                if trade_match:
-                    trade_text = trade_match.group(1).strip()
-                    offer_match = re.search(r"offer:\s*(\d+)\s*energy", trade_text)
-                    to_match = re.search(r"to:\s*(\w+)", trade_text)
-                    
-                    if offer_match and to_match:
-                        return {
-                            "type": "TRADE_OFFER",
-                            "amount": int(offer_match.group(1)),
-                            "to": to_match.group(1)
-                        }
-            
-            # Parse simple action
-            action_match = re.search(r"<ACTION>\s*(.*?)\s*</ACTION>", response_text, re.DOTALL)
-            if action_match:
-                action = action_match.group(1).strip().upper()
-                if action in ["MOVE UP", "MOVE DOWN", "MOVE LEFT", "MOVE RIGHT", "GATHER", "WAIT"]:
-                    return {"type": "ACTION", "action": action}
+            decision = self.parse_decision(response_text)
+            if decision is not None:
+                return decision
             
             # If we get here, something went wrong with parsing
-            print(f"Warning: Could not parse response: {response_text}")
+            logger.warning("Could not parse response: %s", response_text)
             # Default to a random move
-            return {"type": "ACTION", "action": f"MOVE {random.choice(['UP', 'DOWN', 'LEFT', 'RIGHT'])}"}
+            return {"type": "ACTION", "action": f"MOVE {mock_rng.choice(protocol.DIRECTIONS)}"}
             
         except Exception as e:
-            print(f"⚠️ Error parsing response: {e}")
+            logger.warning("⚠️ Error parsing response: %s", e)
             return {"type": "ACTION", "action": "WAIT"}
-    
+
+    @staticmethod
+    def parse_decision(response_text):
+        """Strict version of parse_action: returns None instead of a fallback action"""
+        return protocol.parse_decision(response_text)
+
     def evaluate_trade(self, offer, from_agent):
         # Only evaluate trades if alive
         if not self.is_alive:
             return False, "Agent is dead"
             
         # Make a decision about a trade offer
-        prompt = f"""
-        You are {self.name}, an economic agent with the persona: {self.persona}.
-
-        ENERGY SYSTEM:
-        - You currently have {self.energy} energy
-        - You lose {self.energy_loss_per_turn} energy per turn
-        - You DIE if energy reaches 0
-
-        {from_agent.name} (persona: {from_agent.persona}) is offering you a trade:
-        - They want to give you: {offer['amount']} energy
-
-        Decide whether to ACCEPT or REJECT this offer based on your energy needs and survival.
-        Reply with either:
+        response = call_gemini(self.build_trade_prompt(offer, from_agent), trade_instructions())
+        return self.apply_trade_response(response, offer, from_agent)
 
-        <DECISION>
-        ACCEPT
-        </DECISION>
+    def build_trade_prompt(self, offer, from_agent):
+        return encode_trade_state(self, offer, from_agent)
 
-        OR
+    def apply_trade_response(self, response, offer, from_agent):
+        """Parse an accept/reject reply, remember it as the latest trade and return (accepted, reason)"""
+        accepted, reason = protocol.parse_trade_reply(response)
 
-        <DECISION>
-        REJECT
-        </DECISION>
-
-        <REASON>
-        Brief explanation for your decision
-        </REASON>
-        """
-        
-        response = call_gemini(prompt)
-        
-        # Parse decision
-        decision_match = re.search(r"<DECISION>\s*(.*?)\s*</DECISION>", response, re.DOTALL)
-        reason_match = re.search(r"<REASON>\s*(.*?)\s*</REASON>", response, re.DOTALL)
-        
-        accepted = decision_match and decision_match.group(1).strip().upper() == "ACCEPT"
-        reason = reason_match.group(1).strip() if reason_match else "(No explanation provided)"
-        
         # Save the trade outcome for visualization
         self.latest_trade = {
             "from": from_agent.name,
@@ -205,4 +186,4 @@ class EconomicAgent:
             "reason": reason
         }
         
-        return accepted, reason
\ No newline at end of file
+        return accepted, reason
@@ -0,0 +1,190 @@
+# experiments.py - Parallel parameter sweeps over many seeded headless simulations
+import argparse
+import itertools
+import json
+import os
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Values swept by default when a parameter is not given on the command line
+DEFAULT_GRID = {
+    "size": [9],
+    "agents": [4],
+    "personas": ["Risk-averse"],
+    "energy_per_turn": [100],
+    "replenish_interval": [10],
+    "distribution": ["uniform"],
+}
+
+
+def persona_list(mix, agents):
+    """Expand a comma-separated persona mix to one persona per agent, cycling the mix"""
+    names = [name.strip() for name in mix.split(",") if name.strip()]
+    return [names[i % len(names)] for i in range(agents)]
+
+
+def parameter_grid(grid):
+    """Every combination of the grid values, as a list of config dicts"""
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[key] for key in keys))]
+
+
+def run_one(config, seed, max_steps=1000, policy="random"):
+    """
+    Run a single headless simulation with its own seeded randomness and return its
+    outcome. Executed in a worker process, so it imports the simulation itself and
+    only returns plain data.
+    """
+    import llm_model
+    from simulation import create_simulation
+    from batch_policy import BATCH_POLICIES
+    from replenish import REPLENISHERS
+
+    # Each run reseeds the mock model too, so an LLM-policy run is reproducible per seed
+    llm_model.seed_mock(seed)
+    batch_policy = BATCH_POLICIES[policy](seed=seed) if policy in BATCH_POLICIES else None
+
+    # Runs are silent and keep only a short trade history; only counts are reported
+    sim = create_simulation(width=config["size"], height=config["size"],
+                            personas=persona_list(config["personas"], config["agents"]),
+                            seed=seed, energy_per_turn=config["energy_per_turn"],
+                            replenish_interval=config["replenish_interval"],
+                            replenisher=REPLENISHERS[config["distribution"]](),
+                            trade_history_limit=100, verbose=False, policy=batch_policy)
+    start = time.perf_counter()
+    steps = sim.run(max_steps)
+    elapsed = time.perf_counter() - start
+
+    market = sim.market
+    survivors = len(market.store.living_ids())
+    agent_energy, food_energy, system_energy = market.get_total_system_energy()
+    return {
+        "seed": seed,
+        "steps": steps,
+        "survivors": survivors,
+        "survival_rate": survivors / config["agents"] if config["agents"] else 0.0,
+        "agent_energy": agent_energy,
+        "food_energy": food_energy,
+        "system_energy": system_energy,
+        "trades": market.trade_count,
+        "seconds": elapsed,
+    }
+
+
+def _run_task(task):
+    index, config, seed, max_steps, policy = task
+    return index, run_one(config, seed, max_steps, policy)
+
+
+def summarize(values):
+    """Mean, standard deviation, min and max of a list of numbers"""
+    return {
+        "mean": statistics.fmean(values),
+        "std": statistics.stdev(values) if len(values) > 1 else 0.0,
+        "min": min(values),
+        "max": max(values),
+    }
+
+
+def aggregate(runs):
+    """Collapse the runs of one configuration into summary statistics"""
+    summary = {"runs": len(runs)}
+    for key in ("steps", "survivors", "survival_rate", "agent_energy", "food_energy", "system_energy",
+                "trades"):
+        summary[key] = summarize([run[key] for run in runs])
+    summary["all_survived"] = sum(1 for run in runs if run["survival_rate"] == 1.0) / len(runs)
+    return summary
+
+
+def run_experiments(grid, seeds, max_steps=1000, policy="random", workers=None):
+    """
+    Run every configuration in the grid once per seed across a process pool.
+    Returns a list of {"config", "summary", "runs"} entries in grid order.
+    """
+    configs = parameter_grid(grid)
+    tasks = [(i, config, seed, max_steps, policy) for i, config in enumerate(configs) for seed in seeds]
+    results = [[] for _ in configs]
+
+    # Many small runs per task batch keep inter-process overhead low
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(tasks) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for index, run in executor.map(_run_task, tasks, chunksize=chunksize):
+            results[index].append(run)
+
+    return [{"config": config, "summary": aggregate(runs), "runs": runs}
+            for config, runs in zip(configs, results)]
+
+
+def print_report(experiments):
+    for experiment in experiments:
+        config = experiment["config"]
+        summary = experiment["summary"]
+        print(f"\n🧪 size={config['size']} agents={config['agents']} personas={config['personas']} "
+              f"energy={config['energy_per_turn']} replenish={config['replenish_interval']} "
+              f"distribution={config['distribution']} "
+              f"({summary['runs']} runs)")
+        rate = summary["survival_rate"]
+        print(f"   Survival rate: {rate['mean']:.1%} ± {rate['std']:.1%} "
+              f"(all survived in {summary['all_survived']:.1%} of runs)")
+        steps = summary["steps"]
+        print(f"   Steps: {steps['mean']:.1f} ± {steps['std']:.1f} (min {steps['min']}, max {steps['max']})")
+        energy = summary["agent_energy"]
+        print(f"   Agent energy: {energy['mean']:.1f} ± {energy['std']:.1f}")
+        system = summary["system_energy"]
+        print(f"   System energy: {system['mean']:.1f} ± {system['std']:.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run seeded simulation sweeps in parallel")
+    parser.add_argument("--size", type=int, nargs="+", default=DEFAULT_GRID["size"],
+                        help="Square market sizes to sweep")
+    parser.add_argument("--agents", type=int, nargs="+", default=DEFAULT_GRID["agents"],
+                        help="Agent counts to sweep")
+    parser.add_argument("--personas", nargs="+", default=DEFAULT_GRID["personas"],
+                        help='Persona mixes to sweep, each comma-separated (e.g. "Risk-averse,Risk-taking")')
+    parser.add_argument("--energy", type=int, nargs="+", default=DEFAULT_GRID["energy_per_turn"],
+                        help="Energy input per replenishment to sweep")
+    parser.add_argument("--replenish", type=int, nargs="+", default=DEFAULT_GRID["replenish_interval"],
+                        help="Replenish intervals (steps) to sweep")
+    parser.add_argument("--distribution", nargs="+", default=DEFAULT_GRID["distribution"],
+                        choices=["uniform", "clustered", "regrowth"], help="Food distributions to sweep")
+    parser.add_argument("--runs", type=int, default=100, help="Runs per configuration (seeds 0..N-1)")
+    parser.add_argument("--seeds", type=int, nargs="+", help="Explicit seeds to run instead of --runs")
+    parser.add_argument("--steps", type=int, default=1000, help="Maximum steps per run")
+    parser.add_argument("--policy", choices=["llm", "random", "greedy", "flow"], default="random",
+                        help="Decision policy for every run")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: all cores)")
+    parser.add_argument("--output", help="Write configs, summaries and per-run results to this JSON file")
+    args = parser.parse_args(argv)
+
+    grid = {
+        "size": args.size,
+        "agents": args.agents,
+        "personas": args.personas,
+        "energy_per_turn": args.energy,
+        "replenish_interval": args.replenish,
+        "distribution": args.distribution,
+    }
+    seeds = args.seeds if args.seeds else list(range(args.runs))
+    total = len(parameter_grid(grid)) * len(seeds)
+    print(f"🚀 {total} runs over {len(parameter_grid(grid))} configurations "
+          f"on {args.workers or os.cpu_count()} workers")
+
+    start = time.perf_counter()
+    experiments = run_experiments(grid, seeds, max_steps=args.steps, policy=args.policy,
+                                  workers=args.workers)
+    elapsed = time.perf_counter() - start
+
+    print_report(experiments)
+    print(f"\n⏱️ {total} runs in {elapsed:.1f}s ({total / elapsed:.1f} runs/second)")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"grid": grid, "seeds": seeds, "steps": args.steps, "policy": args.policy,
+                       "experiments": experiments}, f, indent=2)
+        print(f"💾 Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+# Distance-to-nearest-food field, kept up to date incrementally as food appears and disappears
+import numpy as np
+
+# Distance of cells that cannot reach any food (no food on the board)
+UNREACHABLE = np.iinfo(np.int32).max
+
+
+class FlowField:
+    """
+    For every cell, the number of 4-neighbour steps to the nearest food (dist) and
+    which food cell that is (source, a flat y * width + x index). Built with an exact
+    separable distance transform (without obstacles the 4-neighbour BFS distance is
+    the Manhattan distance), then the market reports every cell whose food changes
+    and update() repairs only what those changes affect, in BFS waves:
+
+    - new food relaxes distances outward from the new cells;
+    - removed food invalidates the cells it was nearest to, which are then refilled
+      from the valid cells around them.
+
+    A repair that would touch more than max_work cells (food so sparse that the
+    changes move distances across much of the board) falls back to a full rebuild,
+    which costs about the same. An agent's best move is a lookup of its four neighbours'
+    distances.
+    """
+
+    def __init__(self, market):
+        self.market = market
+        self.width = market.width
+        self.height = market.height
+        self._pending = []
+        self.max_work = max(64, self.width * self.height // 16)
+        self.rebuilds = 0
+        self.updates = 0
+        market.add_food_listener(self._food_changed)
+        self.rebuild()
+
+    def _food_changed(self, cells):
+        self._pending.append(np.asarray(cells, dtype=np.int64).reshape(-1))
+
+    def _has_food(self, cells):
+        food = self.market.food.reshape(self.market.food.shape[0], -1)
+        return food[:, cells].any(axis=0)
+
+    def rebuild(self):
+        """Recompute the whole field from the food on the board: sweeps along the rows, then down the columns"""
+        w, h = self.width, self.height
+        self._pending.clear()
+        self.rebuilds += 1
+        has_food = self.market.food.any(axis=0)
+        if not has_food.any():
+            self.dist = np.full(w * h, UNREACHABLE, dtype=np.int32)
+            self.source = np.full(w * h, -1, dtype=np.int64)
+            return
+
+        # Nearest food within each row, from both directions. Works on the transpose so
+        # every step of the sweep along x is one contiguous row of length h.
+        far = w + h  # Larger than any real distance
+        food_t = np.ascontiguousarray(has_food.T)
+        near_x = np.empty((w, h), dtype=np.int64)
+        last = np.full(h, -far, dtype=np.int64)
+        for x in range(w):
+            last = np.where(food_t[x], x, last)
+            near_x[x] = last
+        last = np.full(h, 2 * far, dtype=np.int64)
+        for x in range(w - 1, -1, -1):
+            last = np.where(food_t[x], x, last)
+            near_x[x] = np.where(last - x < x - near_x[x], last, near_x[x])
+        near_x = np.ascontiguousarray(near_x.T)
+        dist = np.abs(near_x - np.arange(w))
+
+        # Down each column: the best row y' minimising |y - y'| + row distance at y'
+        near_y = np.tile(np.arange(h, dtype=np.int64)[:, None], (1, w))
+        for rows in (range(1, h), range(h - 2, -1, -1)):
+            step = 1 if rows.step > 0 else -1
+            for y in rows:
+                candidate = dist[y - step] + 1
+                closer = candidate < dist[y]
+                dist[y] = np.where(closer, candidate, dist[y])
+                near_y[y] = np.where(closer, near_y[y - step], near_y[y])
+
+        self.dist = dist.astype(np.int32).reshape(-1)
+        self.source = (near_y * w + np.take_along_axis(near_x, near_y, axis=0)).reshape(-1)
+
+    def update(self):
+        """Apply the food changes reported since the last update"""
+        if not self._pending:
+            return
+        cells = np.unique(np.concatenate(self._pending))
+        self._pending.clear()
+        has_food = self._has_food(cells)
+        added = cells[has_food & (self.dist[cells] != 0)]
+        removed = cells[~has_food & (self.dist[cells] == 0)]
+        if not len(added) and not len(removed):
+            return
+        self.updates += 1
+
+        frontier = [added]
+        self.dist[added] = 0
+        self.source[added] = added
+
+        if len(removed):
+            # Cells that relied on removed food lose their distance; the valid cells
+            # bordering that region seed the refill, together with any new food
+            stale = np.flatnonzero(np.isin(self.source, removed))
+            if len(stale) > self.max_work:
+                self.rebuild()
+                return
+            self.dist[stale] = UNREACHABLE
+            self.source[stale] = -1
+            neighbours, _ = self._neighbours(stale)
+            border = neighbours[self.dist[neighbours] != UNREACHABLE]
+            frontier.append(border)
+
+        if not self._relax(np.unique(np.concatenate(frontier))):
+            self.rebuild()
+
+    def _neighbours(self, cells):
+        """Flat indices of the in-bounds 4-neighbours of cells, and which cell each belongs to"""
+        w, h = self.width, self.height
+        xs, ys = cells % w, cells // w
+        found, owners = [], []
+        for dx, dy in ((0, -1), (0, 1), (-1, 0), (1, 0)):
+            nx, ny = xs + dx, ys + dy
+            inside = (nx >= 0) & (nx < w) & (ny >= 0) & (ny < h)
+            found.append((ny * w + nx)[inside])
+            owners.append(cells[inside])
+        return np.concatenate(found), np.concatenate(owners)
+
+    def _relax(self, frontier):
+        """
+        Spread distances outward from frontier until nothing improves (vectorized BFS
+        waves). Returns False if it was cut short after updating more than max_work cells.
+        """
+        dist, source = self.dist, self.source
+        work = 0
+        while work <= self.max_work:
+            neighbours, owners = self._neighbours(frontier)
+            candidate = dist[owners] + 1
+            better = candidate < dist[neighbours]
+            neighbours, owners, candidate = neighbours[better], owners[better], candidate[better]
+            if not len(neighbours):
+                return True
+            # Several frontier cells may reach the same neighbour; keep the shortest
+            order = np.lexsort((candidate, neighbours))
+            neighbours, owners, candidate = neighbours[order], owners[order], candidate[order]
+            first = np.ones(len(neighbours), dtype=bool)
+            first[1:] = neighbours[1:] != neighbours[:-1]
+            neighbours, owners, candidate = neighbours[first], owners[first], candidate[first]
+            dist[neighbours] = candidate
+            source[neighbours] = source[owners]
+            frontier = neighbours
+            work += len(frontier)
+        return False
+
+    def distance_at(self, xs, ys):
+        return self.dist[ys * self.width + xs]
+
+    def neighbour_distances(self, xs, ys):
+        """(n, 4) distances of the UP, DOWN, LEFT and RIGHT neighbours; off-board is UNREACHABLE"""
+        w, h = self.width, self.height
+        result = np.full((len(xs), 4), UNREACHABLE, dtype=np.int32)
+        for k, (dx, dy) in enumerate(((0, -1), (0, 1), (-1, 0), (1, 0))):
+            nx, ny = xs + dx, ys + dy
+            inside = (nx >= 0) & (nx < w) & (ny >= 0) & (ny < h)
+            result[inside, k] = self.dist[ny[inside] * w + nx[inside]]
+        return result
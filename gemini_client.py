@@ -0,0 +1,187 @@
+# Persistent, rate-limited REST client for the Gemini generateContent API
+import http.client
+import json
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+DEFAULT_BASE_URL = "https://generativelanguage.googleapis.com"
+
+# Status codes worth retrying: quota exhaustion and transient server errors
+QUOTA_STATUS = 429
+RETRY_STATUS = {QUOTA_STATUS, 500, 502, 503, 504}
+
+
+class GeminiError(Exception):
+    """Raised when a request still fails after all retries"""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class TokenBucket:
+    """Thread-safe token bucket: allows `rate` requests per second with bursts up to `capacity`"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available and take it. Returns the time spent waiting"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class GeminiClient:
+    """
+    Keeps one HTTP connection per thread open across calls, spaces requests with a
+    token bucket, and retries quota and server errors with exponential backoff and
+    full jitter. base_url can point at a local mock server for offline runs.
+    """
+
+    def __init__(self, api_key, model, base_url=DEFAULT_BASE_URL, requests_per_minute=60,
+                 max_retries=5, backoff_base=1.0, backoff_max=30.0, timeout=60.0):
+        self.api_key = api_key
+        self.model = model
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.limiter = TokenBucket(requests_per_minute / 60.0) if requests_per_minute else None
+
+        url = urlsplit(base_url)
+        self._scheme = url.scheme
+        self._host = url.hostname
+        self._port = url.port
+        self._path = f"{url.path.rstrip('/')}/v1beta/models/{model}:generateContent"
+        self._local = threading.local()
+
+        self._metrics_lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.quota_errors = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.rate_limit_wait = 0.0
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn_class = http.client.HTTPSConnection if self._scheme == "https" else http.client.HTTPConnection
+            conn = conn_class(self._host, self._port, timeout=self.timeout)
+            self._local.conn = conn
+        return conn
+
+    def _drop_connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def _post(self, body):
+        headers = {"Content-Type": "application/json", "x-goog-api-key": self.api_key or ""}
+        conn = self._connection()
+        try:
+            conn.request("POST", self._path, body=body, headers=headers)
+            response = conn.getresponse()
+            return response.status, response.getheader("Retry-After"), response.read()
+        except (OSError, http.client.HTTPException):
+            # The server may have closed a kept-alive connection; reconnect next time
+            self._drop_connection()
+            raise
+
+    def _backoff(self, attempt, retry_after):
+        if retry_after:
+            try:
+                return min(self.backoff_max, float(retry_after))
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def generate(self, prompt, system_instruction=None):
+        """Send one prompt and return the response text. Raises GeminiError on failure"""
+        payload = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+        if system_instruction:
+            payload["systemInstruction"] = {"parts": [{"text": system_instruction}]}
+        body = json.dumps(payload)
+
+        start = time.perf_counter()
+        waited = 0.0
+        try:
+            for attempt in range(self.max_retries + 1):
+                if self.limiter is not None:
+                    waited += self.limiter.acquire()
+
+                status, retry_after, error = None, None, None
+                try:
+                    status, retry_after, data = self._post(body)
+                except (OSError, http.client.HTTPException) as e:
+                    error = f"{type(e).__name__}: {e}"
+
+                if status == 200:
+                    return self._extract_text(data)
+                if status is not None and status not in RETRY_STATUS:
+                    raise GeminiError(f"HTTP {status}: {data[:200]!r}", status)
+
+                if status == QUOTA_STATUS:
+                    with self._metrics_lock:
+                        self.quota_errors += 1
+                if attempt == self.max_retries:
+                    raise GeminiError(error or f"HTTP {status} after {attempt + 1} attempts", status)
+
+                with self._metrics_lock:
+                    self.retries += 1
+                time.sleep(self._backoff(attempt, retry_after))
+        except GeminiError:
+            with self._metrics_lock:
+                self.errors += 1
+            raise
+        finally:
+            latency = time.perf_counter() - start
+            with self._metrics_lock:
+                self.calls += 1
+                self.total_latency += latency
+                self.max_latency = max(self.max_latency, latency)
+                self.rate_limit_wait += waited
+
+    @staticmethod
+    def _extract_text(data):
+        try:
+            parts = json.loads(data)["candidates"][0]["content"]["parts"]
+        except (ValueError, KeyError, IndexError) as e:
+            raise GeminiError(f"Malformed response: {e}")
+        text = "".join(part.get("text", "") for part in parts).strip()
+        if not text:
+            raise GeminiError("Empty response")
+        return text
+
+    def metrics(self):
+        with self._metrics_lock:
+            return {
+                "calls": self.calls,
+                "errors": self.errors,
+                "retries": self.retries,
+                "quota_errors": self.quota_errors,
+                "avg_latency": self.total_latency / self.calls if self.calls else 0.0,
+                "max_latency": self.max_latency,
+                "rate_limit_wait": self.rate_limit_wait,
+            }
+
+    def close(self):
+        self._drop_connection()
@@ -0,0 +1,120 @@
+# Concurrent dispatch of LLM calls for a whole simulation step
+import threading
+from collections import Counter
+from llm_model import call_gemini
+from prompts import decision_instructions, batch_decision_instructions, encode_batch_state
+from protocol import parse_batch
+
+# Side length of the square regions agents are grouped by when batching
+BATCH_REGION_SIZE = 8
+
+# Counters for batched decisions: requests sent, agents decided from a batch,
+# and agents that needed their own call because the batch reply was unusable
+batch_stats = {"batches": 0, "batched_agents": 0, "fallbacks": 0}
+
+# Worker threads for blocking model calls, kept for the whole run: the API client holds
+# one keep-alive connection per thread, so reusing the threads reuses the connections
+_executor = None
+_executor_workers = 0
+_executor_lock = threading.Lock()
+
+
+def _get_executor(workers):
+    """The shared pool, replaced by a larger one if it has fewer than workers threads"""
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is None or _executor_workers < workers:
+            from concurrent.futures import ThreadPoolExecutor
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="llm")
+            _executor_workers = workers
+        return _executor
+
+
+async def _call_all(prompts, max_concurrency, system_instruction):
+    import asyncio
+    semaphore = asyncio.Semaphore(max_concurrency)
+    loop = asyncio.get_running_loop()
+    # call_gemini is blocking, so each call runs in a worker thread. The pool has at least
+    # as many threads as the semaphore allows calls; the default executor may have fewer.
+    executor = _get_executor(max_concurrency)
+
+    async def call(prompt):
+        async with semaphore:
+            return await loop.run_in_executor(executor, call_gemini, prompt, system_instruction)
+
+    return await asyncio.gather(*(call(prompt) for prompt in prompts))
+
+
+def call_gemini_concurrently(prompts, max_concurrency=8, system_instruction=None):
+    """
+    Send every prompt with at most max_concurrency calls in flight.
+    Responses come back in the same order as the prompts.
+    """
+    if not prompts:
+        return []
+    # asyncio is a heavy import that runs without concurrency never need
+    import asyncio
+    return asyncio.run(_call_all(prompts, max(1, max_concurrency), system_instruction))
+
+
+def decide_all(agents, market, max_concurrency=8):
+    """
+    Decide for every living agent against the same market snapshot.
+    All prompts are built before any call is made, the calls run concurrently,
+    and decisions are applied in agent order so results stay deterministic.
+    Returns a list of (agent, decision, raw_response).
+    """
+    agents = [a for a in agents if a.is_alive]
+    prompts = [agent.build_decision_prompt(market) for agent in agents]
+    responses = call_gemini_concurrently(prompts, max_concurrency, decision_instructions())
+    return [(agent, agent.apply_decision(response), response)
+            for agent, response in zip(agents, responses)]
+
+
+def decide_batched(agents, market, batch_size=8, max_concurrency=1):
+    """
+    Decide for every living agent with one request per group of up to batch_size
+    agents. Agents are grouped by region so each batch shares a neighbourhood.
+    Replies are matched to agents by name within their own batch; agents sharing a
+    name are not batched. Any agent whose reply is missing or unparseable, or whose
+    name is not unique, falls back to its own call.
+    Returns a list of (agent, decision, raw_response) in agent order.
+    """
+    agents = [a for a in agents if a.is_alive]
+    states = {agent.id: agent.build_decision_prompt(market) for agent in agents}
+    names = Counter(agent.name for agent in agents)
+
+    def region(agent):
+        x, y = agent.position
+        return (y // BATCH_REGION_SIZE, x // BATCH_REGION_SIZE)
+
+    grouped = sorted((a for a in agents if names[a.name] == 1), key=region)
+    batches = [grouped[i:i + batch_size] for i in range(0, len(grouped), batch_size)]
+    prompts = [encode_batch_state([(a.name, states[a.id]) for a in batch]) for batch in batches]
+    responses = call_gemini_concurrently(prompts, max_concurrency, batch_decision_instructions())
+    batch_stats["batches"] += len(batches)
+
+    # Each reply is parsed once, here; its decision is kept rather than parsed again
+    results = {}
+    for batch, response in zip(batches, responses):
+        replies = parse_batch(response)
+        for agent in batch:
+            reply, decision = replies.get(agent.name, (None, None))
+            if decision is not None:
+                agent.latest_action = decision
+                results[agent.id] = (agent, decision, reply)
+
+    # Agents the batches did not cover get an individual request
+    retry = [agent for agent in agents if agent.id not in results]
+    batch_stats["batched_agents"] += len(results)
+    batch_stats["fallbacks"] += len(retry)
+
+    if retry:
+        retry_responses = call_gemini_concurrently([states[a.id] for a in retry], max_concurrency,
+                                                   decision_instructions())
+        for agent, response in zip(retry, retry_responses):
+            results[agent.id] = (agent, agent.apply_decision(response), response)
+
+    return [results[agent.id] for agent in agents]
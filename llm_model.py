@@ -1,54 +1,355 @@
 # llm_model.py
 import os
+import re
+import time
 import random
-from dotenv import load_dotenv
+import hashlib
+import logging
+import threading
+from collections import OrderedDict, deque
+from prompts import prompt_stats, JSON_DECISION_INSTRUCTIONS, JSON_BATCH_DECISION_INSTRUCTIONS, JSON_TRADE_INSTRUCTIONS
 
-# Load API key from .env file (still load in case we switch to real API later)
-load_dotenv()
+logger = logging.getLogger(__name__)
 
 # Flag to use mock responses instead of real API
 USE_MOCK = True
 
-def call_gemini(prompt):
-    """Mock wrapper for Gemini API to avoid quota issues"""
+MODEL_NAME = 'gemini-1.5-pro-latest'
+
+# Randomness of the mock model and of fallback moves; seed with seed_mock() for repeatable runs
+mock_rng = random.Random()
+
+
+def seed_mock(seed):
+    mock_rng.seed(seed)
+
+
+# Agent blocks in a batched decision prompt (see prompts.encode_batch_state)
+BATCH_AGENT_PATTERN = re.compile(r'<AGENT name="(\w+)">')
+
+
+class CacheMissError(LookupError):
+    """Raised in replay mode when a prompt has no recorded response"""
+
+
+class ResponseCache:
+    """
+    Content-addressed cache of model responses, keyed by a hash of model name and prompt.
+    Keeps an in-memory LRU of at most max_entries and, if path is given, a SQLite store
+    that survives between runs. In replay mode misses raise instead of calling the model.
+    """
+
+    def __init__(self, max_entries=10000, path=None, replay=False):
+        self.max_entries = max_entries
+        self.replay = replay
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path is not None:
+            import sqlite3
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, model TEXT, response TEXT)"
+            )
+
+    @staticmethod
+    def make_key(prompt, model):
+        return hashlib.sha256(f"{model}\0{prompt}".encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            response = self._entries.get(key)
+            if response is not None:
+                self._entries.move_to_end(key)
+            elif self._db is not None:
+                row = self._db.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    response = row[0]
+                    self._remember(key, response)
+
+            if response is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return response
+
+    def put(self, key, response, model=MODEL_NAME):
+        with self._lock:
+            self._remember(key, response)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, model, response) VALUES (?, ?, ?)",
+                    (key, model, response)
+                )
+
+    def _remember(self, key, response):
+        self._entries[key] = response
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def entries(self):
+        """Snapshot of the in-memory entries, oldest first, for checkpoints"""
+        with self._lock:
+            return list(self._entries.items())
+
+    def load_entries(self, entries):
+        with self._lock:
+            for key, response in entries:
+                self._remember(key, response)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self._entries),
+        }
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+# Cache in front of call_gemini; None disables caching
+response_cache = None
+
+
+def enable_cache(max_entries=10000, path=None, replay=False):
+    """Put a ResponseCache in front of call_gemini and return it"""
+    global response_cache
+    disable_cache()
+    response_cache = ResponseCache(max_entries=max_entries, path=path, replay=replay)
+    return response_cache
+
+
+def disable_cache():
+    global response_cache
+    if response_cache is not None:
+        response_cache.close()
+    response_cache = None
+
+
+class DecisionLog:
+    """
+    Every model response of a run, grouped by step and keyed by a hash of the full
+    prompt. While recording, call_gemini appends to it. While replaying, call_gemini
+    hands each prompt's responses back in their original order without calling the
+    model, so a run restored to its initial state reproduces exactly.
+    """
+
+    def __init__(self):
+        self.steps = {}  # step -> {prompt key: [responses in call order]}
+        self.step = 0
+        self.replaying = False
+        self.initial_state = None  # Set by checkpoint.start_recording
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(prompt, system_instruction):
+        return hashlib.sha256(f"{system_instruction or ''}\0{prompt}".encode("utf-8")).digest()
+
+    def begin_step(self, step):
+        with self._lock:
+            self.step = step
+            if self.replaying:
+                self._pending = {key: deque(responses) for key, responses in self.steps.get(step, {}).items()}
+
+    def record(self, key, response):
+        with self._lock:
+            self.steps.setdefault(self.step, {}).setdefault(key, []).append(response)
+
+    def replay(self, key):
+        with self._lock:
+            responses = self._pending.get(key)
+            if not responses:
+                raise CacheMissError(f"No logged response for prompt {key.hex()[:12]} at step {self.step}")
+            return responses.popleft()
+
+    def truncate(self, step):
+        """Forget everything logged from step on, e.g. steps re-run after a resume"""
+        with self._lock:
+            for logged_step in [s for s in self.steps if s >= step]:
+                del self.steps[logged_step]
+
+    def __len__(self):
+        return sum(len(responses) for calls in self.steps.values() for responses in calls.values())
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"], state["_pending"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._pending = {}
+        self._lock = threading.Lock()
+
+
+# Log of model responses for checkpoints and replay; None disables it
+decision_log = None
+
+
+def set_decision_log(log):
+    """Install (or with None, remove) the DecisionLog call_gemini records to or replays from"""
+    global decision_log
+    decision_log = log
+    return log
+
+
+class CallTimer:
+    """Thread-safe latency totals for model calls (cache hits are not timed)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.total = 0.0
+        self._since_drain = (0, 0.0, 0.0)
+
+    def record(self, seconds):
+        with self._lock:
+            self.calls += 1
+            self.total += seconds
+            calls, total, longest = self._since_drain
+            self._since_drain = (calls + 1, total + seconds, max(longest, seconds))
+
+    def drain(self):
+        """Return (calls, total seconds, max seconds) since the previous drain"""
+        with self._lock:
+            since, self._since_drain = self._since_drain, (0, 0.0, 0.0)
+        return since
+
+
+# Latency of every model call; the telemetry recorder drains it once per step
+call_timer = CallTimer()
+
+
+def _timed_generate(prompt, system_instruction):
+    start = time.perf_counter()
+    try:
+        return _generate(prompt, system_instruction)
+    finally:
+        call_timer.record(time.perf_counter() - start)
+
+
+def call_gemini(prompt, system_instruction=None):
+    """
+    Call the model, serving identical prompts from the response cache when enabled.
+    system_instruction carries the static rules so prompt only needs the per-step state.
+    With a decision log set, responses are recorded to it, or replayed from it.
+    """
+    prompt_stats.record(system_instruction or "", prompt)
+
+    log = decision_log
+    if log is None:
+        return _cached_generate(prompt, system_instruction)
+    key = log.make_key(prompt, system_instruction)
+    if log.replaying:
+        return log.replay(key)
+    response = _cached_generate(prompt, system_instruction)
+    log.record(key, response)
+    return response
+
+
+def _cached_generate(prompt, system_instruction):
+    cache = response_cache
+    if cache is None:
+        return _timed_generate(prompt, system_instruction)[0]
+
+    model = "mock" if USE_MOCK else MODEL_NAME
+    key = cache.make_key(f"{system_instruction or ''}\n\n{prompt}", model)
+    response = cache.get(key)
+    if response is not None:
+        return response
+    if cache.replay:
+        raise CacheMissError(f"No recorded response for prompt {key[:12]} in replay mode")
+
+    response, ok = _timed_generate(prompt, system_instruction)
+    # Fallback responses after an API error are not worth remembering
+    if ok:
+        cache.put(key, response, model)
+    return response
+
+
+def get_client():
+    """Return the shared GeminiClient, creating it on first use from environment settings"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            # Only real API runs need the .env file and the HTTP client, so both load here
+            from dotenv import load_dotenv
+            from gemini_client import GeminiClient, DEFAULT_BASE_URL
+            load_dotenv()
+            _client = GeminiClient(
+                api_key=os.getenv("GEMINI_API_KEY"),
+                model=MODEL_NAME,
+                base_url=os.getenv("GEMINI_API_BASE", DEFAULT_BASE_URL),
+                requests_per_minute=float(os.getenv("GEMINI_RPM", "60")),
+            )
+        return _client
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def _generate(prompt, system_instruction=None):
+    """
+    Mock wrapper for Gemini API to avoid quota issues.
+    Returns (response_text, ok); ok is False for fallback responses after an error.
+    """
     if USE_MOCK:
-        # Simple decision-making logic based on prompt content
-        
-        # Parse agent position
-        position_match = None
-        if "position:" in prompt:
-            lines = prompt.split("\n")
-            for line in lines:
-                if "position:" in line:
-                    position_match = line
-                    break
-        
-        # Generate a reasonable action
-        actions = ["MOVE UP", "MOVE DOWN", "MOVE LEFT", "MOVE RIGHT", "GATHER"]
-        
-        # If the prompt mentions food in the current position, prefer GATHER
-        if "food: 0" not in prompt and "Gather if resources are present" in prompt:
-            action = "GATHER" if random.random() < 0.7 else random.choice(actions)
-        else:
-            # Otherwise move randomly
-            action = random.choice(actions)
-            
-        # Format as proper XML response
-        return f"<ACTION>\n{action}\n</ACTION>"
+        # The mock answers in whichever format the instructions ask for
+        as_json = system_instruction in (JSON_DECISION_INSTRUCTIONS, JSON_BATCH_DECISION_INSTRUCTIONS,
+                                         JSON_TRADE_INSTRUCTIONS)
+        # Batched prompts get one reply block (or JSON line) per agent
+        names = BATCH_AGENT_PATTERN.findall(prompt)
+        if names and as_json:
+            return "\n".join('{"agent": "%s", %s' % (name, _mock_response(prompt, True)[1:]) for name in names), True
+        if names:
+            return "\n".join(f'<AGENT name="{name}">\n{_mock_response(prompt)}\n</AGENT>' for name in names), True
+        return _mock_response(prompt, as_json), True
     
-    # Actual API call (not used due to quota)
+    # Real API call through the persistent client (retries and rate limiting happen there)
+    from gemini_client import GeminiError
     try:
-        import google.generativeai as genai
-        genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-        
-        model = genai.GenerativeModel('gemini-1.5-pro-latest')
-        response = model.generate_content(prompt)
+        return get_client().generate(prompt, system_instruction), True
+    except GeminiError as e:
+        logger.warning("⚠️ Gemini API call failed, falling back to a random move: %s", e)
+        return f"<ACTION>\nMOVE {mock_rng.choice(['UP', 'DOWN', 'LEFT', 'RIGHT'])}\n</ACTION>", False
+
+
+def _mock_response(prompt, as_json=False):
+    """Random but well-formed reply used while USE_MOCK is set; as_json gives the JSON protocol's form"""
+    # Simple decision-making logic based on prompt content
+    
+    # Parse agent position
+    position_match = None
+    if "position:" in prompt:
+        lines = prompt.split("\n")
+        for line in lines:
+            if "position:" in line:
+                position_match = line
+                break
+    
+    # Generate a reasonable action
+    actions = ["MOVE UP", "MOVE DOWN", "MOVE LEFT", "MOVE RIGHT", "GATHER"]
+    
+    # If the prompt mentions food in the current position, prefer GATHER
+    if "food: 0" not in prompt and "Gather if resources are present" in prompt:
+        action = "GATHER" if mock_rng.random() < 0.7 else mock_rng.choice(actions)
+    else:
+        # Otherwise move randomly
+        action = mock_rng.choice(actions)
         
-        if not response.text:
-            print("⚠️ Empty response from Gemini")
-            return "<ACTION>\nMOVE UP\n</ACTION>"
-            
-        return response.text.strip()
-    except Exception as e:
-        print(f"⚠️ Error calling Gemini API: {e}")
-        return f"<ACTION>\nMOVE {random.choice(['UP', 'DOWN', 'LEFT', 'RIGHT'])}\n</ACTION>"
\ No newline at end of file
+    if as_json:
+        if action.startswith("MOVE "):
+            return f'{{"action": "MOVE", "direction": "{action[5:]}"}}'
+        return f'{{"action": "{action}"}}'
+    # Format as proper XML response
+    return f"<ACTION>\n{action}\n</ACTION>"
\ No newline at end of file
@@ -1,232 +1,253 @@
 # main.py - Energy-based economic simulation
+import argparse
+import logging
 import time
-import random
-import pygame
-from market import Market
-from economic_agent import EconomicAgent
-from visualization import Visualization
-
-def main():
-    # Create market
-    market = Market(width=9, height=9)
-
-    simulation_speed = 1.0  # seconds per step
-    
+from simulation import create_simulation
+from batch_policy import BATCH_POLICIES
+import llm_model
+import prompts
+from prompts import prompt_stats
+from protocol import parse_stats
+from llm_dispatch import batch_stats
+from telemetry import TelemetryRecorder, remove_telemetry
+from replenish import REPLENISHERS
+from checkpoint import load_checkpoint, replay, run_with_checkpoints, start_recording
+from profiler import PhaseProfiler
+
+
+def run_visual(max_steps=1000, width=9, height=9, agents=4, seed=None, distribution="uniform", profile=False,
+               check_frames=False):
+    # pygame is only needed for the windowed mode, so headless runs never import it
+    import pygame
+    from visualization import Visualization
+    from simulation_thread import SimulationWorker
+
+    # Create market and agents
+    profiler = PhaseProfiler() if profile else None
+    sim = create_simulation(width=width, height=height, personas=["Risk-averse"] * agents, seed=seed,
+                            replenisher=REPLENISHERS[distribution](), profiler=profiler)
+
+    # The simulation steps on its own thread; this loop only draws and forwards controls
+    worker = SimulationWorker(sim, max_steps=max_steps, step_delay=1.0)
+
     # Initialize visualization
-    vis = Visualization(width=9, height=9)
-    
-    # Create agents with different personas
-    personas = ["Risk-averse", "Risk-averse", "Risk-averse", "Risk-averse"]
-    agents = [EconomicAgent(f"Agent_{i+1}", personas[i]) for i in range(4)]
-    
-    # Add agents to different positions to avoid starting in the same place
-    positions = [(2, 2), (6, 2), (2, 6), (6, 6)]
-    for i, agent in enumerate(agents):
-        market.add_agent(agent, positions[i][0], positions[i][1])
-    
-    # Main simulation loop
-    step = 0
-    running = True
-    paused = False
-    
+    vis = Visualization(width=sim.market.width, height=sim.market.height, profiler=profiler,
+                        check_frames=check_frames)
+
     print("=== Energy-Based Economic Agent Simulation Started ===")
     print("Energy Rules:")
     print("- Red food: 50 energy each")
-    print("- Green food: 5 energy each") 
+    print("- Green food: 5 energy each")
     print("- Agents lose 2 energy per turn")
     print("- Agents die when energy ≤ 0")
     print("Controls: ESC to exit, SPACE to pause/resume, RIGHT ARROW to step when paused")
-    
+    print("Camera: WASD to pan, +/- or mouse wheel to zoom")
+
     clock = pygame.time.Clock()
-    
-    while running and step <= 1000:  # Run for 1000 steps max
+    worker.start()
+    snapshot = None
+
+    while True:
         # Check for events (including pause/step controls)
         running, action = vis.check_events()
         if not running:
+            worker.send("STOP")
             break
+        if action is not None:
+            worker.send(action)
+
+        # Draw the newest step the simulation has published, if any
+        latest = worker.latest_snapshot()
+        if latest is not None:
+            snapshot = latest
+        if snapshot is not None:
+            if profiler is None:
+                vis.update(snapshot)
+            else:
+                start = time.perf_counter_ns()
+                vis.update(snapshot)
+                profiler.record("render", time.perf_counter_ns() - start)
 
-        if action == "SPEED_UP":
-            simulation_speed = max(0.2, simulation_speed - 0.2)
-            print(f"Speed increased: {1/simulation_speed:.1f} steps/second")
-        elif action == "SPEED_DOWN":
-            simulation_speed = min(5.0, simulation_speed + 0.2)
-            print(f"Speed decreased: {1/simulation_speed:.1f} steps/second")
-            
-        if action == "PAUSE":
-            paused = not paused
-            print(f"Simulation {'paused' if paused else 'resumed'}")
-        
-        if paused and action != "STEP":
-            # If paused and not stepping, just update the display and continue
-            vis.update(market)
-            clock.tick(30)  # Limit frame rate while paused
-            continue
-            
-        print(f"\n=== Step {step + 1} ===")
-        
-        # ENERGY LOSS: All agents lose energy per turn
-        print("⚡ Agents lose energy...")
-        for agent in market.agents:
-            if agent.is_alive:
-                old_energy = agent.energy
-                agent.lose_energy_per_turn()
-                if agent.is_alive:
-                    print(f"  {agent.name}: {old_energy} → {agent.energy} energy")
-        
-        # Remove dead agents
-        dead_count = market.remove_dead_agents()
-        if dead_count > 0:
-            print(f"💀 {dead_count} agent(s) died this turn")
-        
-        # Check if all agents are dead
-        if not market.agents:
-            print("💀 All agents have died! Simulation ending.")
+        if not worker.is_alive() and worker.snapshots.empty():
             break
-        
-        # Process each living agent
-        for agent in market.agents:
-            if not agent.is_alive:
-                continue
-            
-            # DEBUG: Show what agent sees at their current position
-            x, y = agent.position
-            current_cell = market.grid[y][x]
-            print(f"🔍 {agent.name} at {agent.position}: Red food: {current_cell['red_food']}, Green food: {current_cell['green_food']}, Energy: {agent.energy}")
-                
-            # Get decision from the agent
-            decision, raw_response = agent.decide_action(market)
-            
-            # Skip dead agents
-            if decision["type"] == "ACTION" and decision.get("action") == "DEAD":
-                continue
-            
-            # Debug output - limited to first 100 chars for readability
-            debug_response = raw_response[:100] + "..." if len(raw_response) > 100 else raw_response
-            print(f"\n{agent.name} ({agent.persona}) raw response (truncated):\n{debug_response}")
-            
-            # Execute the decision
-            if decision["type"] == "ACTION":
-                action = decision["action"]
-                print(f"{agent.name} ({agent.persona}) decided: {action}")
-                
-                if action.startswith("MOVE"):
-                    direction = action.split()[-1]
-                    old_pos = agent.position
-                    market.move_agent(agent, direction)
-                    if agent.position != old_pos:
-                        print(f"🚶 {agent.name} moved {direction} from {old_pos} to {agent.position}")
-                    else:
-                        print(f"🚫 {agent.name} tried to move {direction} but hit boundary at {old_pos}")
-                
-                elif action == "GATHER":
-                    energy_gained = market.gather_resources(agent)
-                    if energy_gained > 0:
-                        print(f"⚡ {agent.name} gained {energy_gained} energy (total: {agent.energy})")
-                    else:
-                        print(f"❌ {agent.name} found no food to gather")
-                
-                elif action == "WAIT":
-                    print(f"⏳ {agent.name} waits")
-            
-            elif decision["type"] == "TRADE_OFFER":
-                target_name = decision["to"]
-                amount = decision["amount"]
-                
-                # Find the target agent
-                target = next((a for a in market.agents if a.name == target_name and a.is_alive), None)
-                
-                if target and target in market.nearby_agents(agent):
-                    print(f"💬 {agent.name} offers {amount} energy to {target_name}")
-                    
-                    # Check if agent has enough energy (and won't die from giving it away)
-                    if agent.energy > amount and (agent.energy - amount) > agent.energy_loss_per_turn:
-                        # Let target evaluate the offer
-                        accepted, reason = target.evaluate_trade(decision, agent)
-                        
-                        if accepted:
-                            # Execute the trade
-                            agent.energy -= amount
-                            target.energy += amount
-                            
-                            print(f"✅ {target_name} accepted: {reason}")
-                            print(f"  {agent.name}: {agent.energy + amount} → {agent.energy} energy")
-                            print(f"  {target_name}: {target.energy - amount} → {target.energy} energy")
-                            
-                            # Record the trade
-                            market.trade_history.append({
-                                "step": step,
-                                "from": agent.name,
-                                "to": target_name,
-                                "energy": amount
-                            })
-                        else:
-                            print(f"❌ {target_name} rejected: {reason}")
-                    else:
-                        if agent.energy <= amount:
-                            print(f"❌ Trade failed: {agent.name} doesn't have enough energy")
-                        else:
-                            print(f"❌ Trade failed: {agent.name} would die from giving away energy")
-                else:
-                    print(f"❌ Trade failed: {target_name} not found or too far away")
-        
-        # Replenish resources every 10 steps
-        if step % 10 == 0:
-            market.replenish_resources()  # Uses default energy input per turn
-        
-        # Print system energy status every 5 steps
-        if step % 5 == 0:
-            agent_energy, food_energy, total_energy = market.get_total_system_energy()
-            alive_count = len([a for a in market.agents if a.is_alive])
-            print(f"📊 System Status: {alive_count} agents, {agent_energy} agent energy, {food_energy} food energy, {total_energy} total")
-        
-        # Update visualization
-        vis.update(market)
-        
-        step += 1
-        
-        # Control simulation speed
-        if not paused:
-            clock.tick(2)  # 2 frames per second when running
-            time.sleep(simulation_speed)
-    
-    print("\n=== Simulation Ended ===")
-    print(f"Total steps: {step}")
-    print("\nFinal Agent States:")
-    
-    for agent in market.agents:
-        status = f"Energy: {agent.energy}" if agent.is_alive else "DEAD"
-        print(f"{agent.name} ({agent.persona}) - {status}")
-    
-    # Energy system statistics
-    if market.agents:
-        alive_agents = [a for a in market.agents if a.is_alive]
-        if alive_agents:
-            avg_energy = sum(a.energy for a in alive_agents) / len(alive_agents)
-            print(f"\nSurviving agents: {len(alive_agents)}")
-            print(f"Average energy: {avg_energy:.1f}")
-    
-    # Trade statistics
-    if market.trade_history:
-        print("\nTrade Statistics:")
-        print(f"Total trades: {len(market.trade_history)}")
-        
-        # Count trades by agent
-        agent_trades = {}
-        for trade in market.trade_history:
-            agent_trades[trade["from"]] = agent_trades.get(trade["from"], 0) + 1
-        
-        for agent_name, count in agent_trades.items():
-            print(f"{agent_name} initiated {count} trades")
-    
-    # Final system energy
-    agent_energy, food_energy, total_energy = market.get_total_system_energy()
-    print(f"\nFinal System Energy: {total_energy} (Agents: {agent_energy}, Food: {food_energy})")
-    
+        clock.tick(30)  # The UI frame rate is independent of the step rate
+
+    worker.join()
+    sim.print_summary()
+
     # Wait for a moment before closing
     time.sleep(3)
-    
+
     # Clean up
     vis.close()
 
+
+def run_headless(max_steps=1000, verbose=True, policy="llm", max_concurrency=1, batch_size=1,
+                 width=9, height=9, agents=4, seed=None, telemetry_path=None, trade_history_limit=None,
+                 checkpoint_path=None, checkpoint_every=25, resume_path=None, check_energy=False,
+                 distribution="uniform", profile=False, profile_path=None):
+    profiler = PhaseProfiler() if profile or profile_path else None
+    telemetry = None
+    if telemetry_path:
+        remove_telemetry(telemetry_path)
+        telemetry = TelemetryRecorder(telemetry_path)
+
+    if resume_path:
+        # Settings come from the checkpoint; --steps still counts from step 0
+        sim = load_checkpoint(resume_path, verbose=verbose, telemetry=telemetry, profiler=profiler)
+        sim.market.check_energy = check_energy
+        print(f"♻️ Resumed from {resume_path} at step {sim.step_count}")
+        max_steps = max(0, max_steps - sim.step_count)
+    else:
+        batch_policy = BATCH_POLICIES[policy](seed=seed) if policy in BATCH_POLICIES else None
+        sim = create_simulation(width=width, height=height, personas=["Risk-averse"] * agents,
+                                seed=seed, trade_history_limit=trade_history_limit,
+                                check_energy=check_energy, replenisher=REPLENISHERS[distribution](),
+                                verbose=verbose,
+                                policy=batch_policy, max_concurrency=max_concurrency, batch_size=batch_size,
+                                telemetry=telemetry, profiler=profiler)
+
+    start = time.perf_counter()
+    if checkpoint_path:
+        if llm_model.decision_log is None:
+            start_recording(sim)
+        steps_run = run_with_checkpoints(sim, max_steps, checkpoint_path, checkpoint_every)
+    else:
+        steps_run = sim.run(max_steps)
+    elapsed = time.perf_counter() - start
+    if telemetry is not None:
+        telemetry.close()
+
+    sim.print_summary()
+    rate = steps_run / elapsed if elapsed > 0 else float("inf")
+    print(f"\n⏱️ {steps_run} steps in {elapsed:.3f}s ({rate:.0f} steps/second)")
+
+    if prompt_stats.calls:
+        sizes = prompt_stats.summary()
+        print(f"📝 Prompts: {sizes['calls']} calls, {sizes['avg_chars']:.0f} chars avg "
+              f"(~{sizes['avg_tokens_est']:.0f} tokens, {sizes['avg_state_chars']:.0f} per-step state), "
+              f"{sizes['max_chars']} max")
+
+    if batch_stats["batches"]:
+        print(f"📦 Batched decisions: {batch_stats['batches']} requests for {batch_stats['batched_agents']} "
+              f"agent decisions, {batch_stats['fallbacks']} per-agent fallbacks")
+
+    if any(parse_stats.values()):
+        print(f"🧾 Replies parsed: {parse_stats['json']} JSON, {parse_stats['xml']} XML, "
+              f"{parse_stats['failed']} unparseable")
+
+    if not llm_model.USE_MOCK:
+        metrics = llm_model.get_client().metrics()
+        print(f"🌐 Gemini API: {metrics['calls']} calls, {metrics['errors']} failed, "
+              f"{metrics['retries']} retries ({metrics['quota_errors']} quota errors), "
+              f"{metrics['avg_latency'] * 1000:.0f} ms avg / {metrics['max_latency'] * 1000:.0f} ms max latency")
+
+    if llm_model.response_cache is not None:
+        stats = llm_model.response_cache.stats()
+        print(f"🗃️ Response cache: {stats['hits']} hits, {stats['misses']} misses "
+              f"({stats['hit_rate']:.1%} hit rate, {stats['size']} entries)")
+
+    if checkpoint_path:
+        print(f"💾 Checkpoint at step {sim.step_count} in {checkpoint_path} "
+              f"({len(llm_model.decision_log)} logged responses)")
+
+    if telemetry is not None:
+        print(f"📈 Telemetry: {telemetry.rows} steps in {telemetry.chunks_written} chunk(s) at {telemetry_path}")
+
+    if profiler is not None:
+        print(f"\n🔬 Step phases over the last {min(profiler.steps, profiler.window)} steps:")
+        for line in profiler.report_lines():
+            print(f"   {line}")
+        if profile_path:
+            profiler.export(profile_path)
+            print(f"💾 Phase timings written to {profile_path}")
+
+
+def run_replay(path, verbose=True):
+    """Re-run a checkpointed run from its decision log, without calling the model"""
+    start = time.perf_counter()
+    sim, steps_run = replay(path, verbose=verbose)
+    elapsed = time.perf_counter() - start
+    sim.print_summary()
+    print(f"\n⏪ Replayed {steps_run} steps from {path} in {elapsed:.3f}s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Energy-based economic agent simulation")
+    parser.add_argument("--headless", action="store_true",
+                        help="Run without a display (pygame is never imported)")
+    parser.add_argument("--steps", type=int, default=1000, help="Maximum number of steps to run")
+    parser.add_argument("--quiet", action="store_true", help="Suppress per-step output")
+    parser.add_argument("--log-level", choices=["DEBUG", "INFO", "WARNING", "ERROR"], default="INFO",
+                        help="Log level for progress output (DEBUG adds per-agent lines)")
+    parser.add_argument("--telemetry",
+                        help="Record per-step metrics to this path (.parquet needs pyarrow, otherwise NPZ chunks)")
+    parser.add_argument("--trade-history", type=int,
+                        help="Keep only the last N trades in memory (default: keep all)")
+    parser.add_argument("--width", type=int, default=9, help="Market width in cells")
+    parser.add_argument("--height", type=int, default=9, help="Market height in cells")
+    parser.add_argument("--agents", type=int, default=4, help="Number of agents")
+    parser.add_argument("--seed", type=int, help="Seed market and mock model randomness for a repeatable run")
+    parser.add_argument("--distribution", choices=list(REPLENISHERS), default="uniform",
+                        help="Where replenished food appears")
+    parser.add_argument("--policy", choices=["llm"] + list(BATCH_POLICIES), default="llm",
+                        help="Decision policy for headless runs")
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="Maximum concurrent LLM calls per step (1 = decide agents one by one)")
+    parser.add_argument("--batch-size", type=int, default=1,
+                        help="Agents decided per LLM request (1 = one request per agent)")
+    parser.add_argument("--cache-size", type=int, default=0,
+                        help="Cache up to N LLM responses in memory (0 disables the cache)")
+    parser.add_argument("--cache-db", help="SQLite file that persists cached LLM responses")
+    parser.add_argument("--replay", action="store_true",
+                        help="Serve LLM responses only from the cache; a miss is an error")
+    parser.add_argument("--check-energy", action="store_true",
+                        help="Debug: recount all energy every step and check it is conserved")
+    parser.add_argument("--check-frames", action="store_true",
+                        help="Debug: compare every incrementally drawn frame with a full redraw")
+    parser.add_argument("--checkpoint",
+                        help="Record model responses and save the full state to this file as the run goes")
+    parser.add_argument("--checkpoint-every", type=int, default=25, help="Steps between checkpoints")
+    parser.add_argument("--resume", help="Continue a headless run from this checkpoint file")
+    parser.add_argument("--replay-log",
+                        help="Replay the run recorded in this checkpoint from its decision log (no model calls)")
+    parser.add_argument("--profile", action="store_true",
+                        help="Time each step phase (p50/p95/p99); shown on screen, or printed after a headless run")
+    parser.add_argument("--profile-output", help="Headless: write the phase timings to this JSON file")
+    parser.add_argument("--response-format", choices=prompts.RESPONSE_FORMATS, default="xml",
+                        help="Ask the model for XML tags or one JSON object per reply (XML is still accepted)")
+    parser.add_argument("--real-api", action="store_true",
+                        help="Call the Gemini API (or GEMINI_API_BASE) instead of the built-in mock")
+    args = parser.parse_args(argv)
+
+    # Log lines keep the plain, emoji-prefixed look of the original print output
+    logging.basicConfig(level=logging.WARNING if args.quiet else getattr(logging, args.log_level),
+                        format="%(message)s")
+
+    if args.real_api:
+        llm_model.USE_MOCK = False
+    if args.seed is not None:
+        llm_model.seed_mock(args.seed)
+    prompts.set_response_format(args.response_format)
+
+    if args.cache_size or args.cache_db or args.replay:
+        llm_model.enable_cache(max_entries=args.cache_size or 10000, path=args.cache_db,
+                               replay=args.replay)
+
+    if args.replay_log:
+        run_replay(args.replay_log, verbose=not args.quiet)
+    elif args.headless:
+        run_headless(max_steps=args.steps, verbose=not args.quiet, policy=args.policy,
+                     max_concurrency=args.concurrency, batch_size=args.batch_size,
+                     width=args.width, height=args.height, agents=args.agents, seed=args.seed,
+                     telemetry_path=args.telemetry, trade_history_limit=args.trade_history,
+                     checkpoint_path=args.checkpoint or args.resume, checkpoint_every=args.checkpoint_every,
+                     resume_path=args.resume, check_energy=args.check_energy,
+                     distribution=args.distribution, profile=args.profile, profile_path=args.profile_output)
+    else:
+        run_visual(max_steps=args.steps, width=args.width, height=args.height, agents=args.agents,
+                   seed=args.seed, distribution=args.distribution, profile=args.profile,
+                   check_frames=args.check_frames)
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,18 +1,163 @@
 # Market code with red and green food energy system
 import random
+import logging
+from collections import deque
 import numpy as np
+from agent_store import AgentStore, AgentColumns
+from economic_agent import EconomicAgent
+from replenish import RED_SHARE, UniformReplenisher, split_energy
+from trades import TradeBook
+
+logger = logging.getLogger(__name__)
+
+# Energy value of each food unit
+RED_FOOD_ENERGY = 50
+GREEN_FOOD_ENERGY = 5
+
+# Layer index of each food type in Market.food
+FOOD_LAYERS = {"red_food": 0, "green_food": 1}
+FOOD_ENERGY = np.array([RED_FOOD_ENERGY, GREEN_FOOD_ENERGY], dtype=np.int64)
+
+
+class _CellView:
+    """Dict-like view of one grid cell, backed by the market's food arrays"""
+    __slots__ = ("_market", "_x", "_y")
+
+    def __init__(self, market, x, y):
+        self._market = market
+        self._x = x
+        self._y = y
+
+    def __getitem__(self, key):
+        return int(self._market.food[FOOD_LAYERS[key], self._y, self._x])
+
+    def __setitem__(self, key, value):
+        self._market.set_food(self._x, self._y, key, value)
+
+    def keys(self):
+        return FOOD_LAYERS.keys()
+
+    def __repr__(self):
+        return repr({key: self[key] for key in FOOD_LAYERS})
+
+
+class _RowView:
+    __slots__ = ("_market", "_y")
+
+    def __init__(self, market, y):
+        self._market = market
+        self._y = y
+
+    def __getitem__(self, x):
+        if not 0 <= x < self._market.width:
+            raise IndexError("grid column out of range")
+        return _CellView(self._market, x, self._y)
+
+    def __len__(self):
+        return self._market.width
+
+
+class GridView:
+    """
+    Compatibility view so existing grid[y][x]["red_food"] reads and writes
+    keep working on top of the NumPy food arrays. Writes go through
+    Market.set_food, so they keep the running food totals and food listeners current.
+    """
+    __slots__ = ("_market",)
+
+    def __init__(self, market):
+        self._market = market
+
+    def __getitem__(self, y):
+        if not 0 <= y < self._market.height:
+            raise IndexError("grid row out of range")
+        return _RowView(self._market, y)
+
+    def __len__(self):
+        return self._market.height
+
+    def __iter__(self):
+        return (_RowView(self._market, y) for y in range(len(self)))
+
+
+class EnergyAccountingError(RuntimeError):
+    """Raised when the running energy totals disagree with a full recount"""
+
 
 class Market:
-    def __init__(self, width=9, height=9):
+    def __init__(self, width=9, height=9, seed=None, energy_per_turn=100, trade_history_limit=None,
+                 check_energy=False, replenisher=None, red_share=RED_SHARE):
         self.width = width
         self.height = height
-        # Track both red food (50 energy) and green food (5 energy)
-        self.grid = [[{"red_food": 0, "green_food": 0} for _ in range(width)] for _ in range(height)]
-        self.agents = []
-        self.trade_history = []
-        self.total_energy_added_per_turn = 100  # Fixed energy input to system
+        # All market randomness comes from these generators, so a seed reproduces a run:
+        # rng for per-item draws, np_rng for vectorized ones
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.np_rng = np.random.default_rng(seed)
+        # Where replenished food goes, and the share of its energy that comes as red food
+        self.replenisher = replenisher if replenisher is not None else UniformReplenisher()
+        self.red_share = red_share
+        self.replenish_leftover = 0  # Budget too small for a unit, carried to the next replenishment
+        # Track both red food (50 energy) and green food (5 energy) as one
+        # contiguous (2, height, width) array; red_food/green_food are views into it
+        self.food = np.zeros((len(FOOD_LAYERS), height, width), dtype=np.int64)
+        self.red_food = self.food[FOOD_LAYERS["red_food"]]
+        self.green_food = self.food[FOOD_LAYERS["green_food"]]
+        self.grid = GridView(self)
+        # Running food energy, and all food energy ever added, so the system energy is
+        # O(1) to read. With check_energy, Simulation verifies them every step.
+        self.food_energy = 0
+        self.food_in = 0
+        self.check_energy = check_energy
+        # Agent population as NumPy columns; Market.agents hands out EconomicAgent views
+        self.store = AgentStore()
+        self.agent_count = 0  # Agents still in the market, alive or not yet removed
+        # Spatial index: (x, y) -> ids of the agents standing on that cell. Kept up to
+        # date by add_agent, move_agent and remove_dead_agents, so agent positions should
+        # only change through Market methods. Bulk moves only mark it stale; it is then
+        # rebuilt from the columns on the next lookup.
+        self.agents_by_cell = {}
+        self._index_stale = False
+        # Completed trades; with a limit only the most recent ones are kept, while
+        # trade_count keeps counting all of them
+        self.trade_history = deque(maxlen=trade_history_limit) if trade_history_limit else []
+        self.trade_count = 0
+        # Offers made this step, settled together by clear_trades
+        self.trade_book = TradeBook()
+        self.total_energy_added_per_turn = energy_per_turn  # Fixed energy input to system
+        # Callbacks told which cells' food changed (flat y * width + x indices), e.g. a
+        # FlowField keeping its distances current
+        self.food_listeners = []
         self.distribute_resources()
 
+    def add_food_listener(self, listener):
+        self.food_listeners.append(listener)
+
+    def remove_food_listener(self, listener):
+        if listener in self.food_listeners:
+            self.food_listeners.remove(listener)
+
+    def food_changed(self, cells):
+        """Tell the food listeners that the food on the given flat cell indices changed"""
+        for listener in self.food_listeners:
+            listener(cells)
+
+    def set_food(self, x, y, food_type, count):
+        """
+        Set how many units of food_type ("red_food" or "green_food") cell (x, y) holds.
+        The energy difference counts as food brought into (or taken out of) the system,
+        and food listeners are told about the cell.
+        """
+        if count < 0:
+            raise ValueError(f"Food count must not be negative, got {count}")
+        layer = FOOD_LAYERS[food_type]
+        added = (int(count) - int(self.food[layer, y, x])) * int(FOOD_ENERGY[layer])
+        self.food[layer, y, x] = count
+        if added:
+            self.food_energy += added
+            self.food_in += added
+            self.food_changed([y * self.width + x])
+
     def distribute_resources(self):
         """Create initial distribution of red and green food"""
         # Calculate how much energy to distribute initially
@@ -25,26 +170,96 @@ class Market:
                     break
                     
                 # 15% chance of food in each cell
-                if random.random() < 0.15:
+                if self.rng.random() < 0.15:
                     # Decide between red and green food (70% red, 30% green for balance)
-                    if random.random() < 0.7:
+                    if self.rng.random() < 0.7:
                         # Red food (50 energy each)
-                        amount = random.randint(1, 2)
-                        self.grid[y][x]["red_food"] = amount
-                        energy_distributed += amount * 50
+                        amount = self.rng.randint(1, 2)
+                        self.red_food[y, x] = amount
+                        energy_distributed += amount * RED_FOOD_ENERGY
                     else:
                         # Green food (5 energy each)
-                        amount = random.randint(1, 5)
-                        self.grid[y][x]["green_food"] = amount
-                        energy_distributed += amount * 5
+                        amount = self.rng.randint(1, 5)
+                        self.green_food[y, x] = amount
+                        energy_distributed += amount * GREEN_FOOD_ENERGY
+
+        self.food_energy += energy_distributed
+        self.food_in += energy_distributed
+
+    @property
+    def agents(self):
+        """
+        Views of the agents still in the market, in the order they were added. This is
+        a fresh tuple on every access, built from the agent store, so it cannot be
+        appended to: add agents with add_agent or add_agents.
+        """
+        store = self.store
+        return tuple(EconomicAgent.bind(store, i) for i in store.active_ids().tolist())
+
+    def agent_columns(self):
+        """A read-only AgentColumns copy of the agents in the market, for drawing"""
+        return AgentColumns(self.store)
 
     def add_agent(self, agent, x=None, y=None):
         # Add agent to a random position or specific position
         if x is None:
-            x = random.randint(0, self.width - 1)
-            y = random.randint(0, self.height - 1)
+            x = self.rng.randint(0, self.width - 1)
+            y = self.rng.randint(0, self.height - 1)
+        # The agent's row moves into the market's store and the view follows it
+        if agent.store is not self.store:
+            agent.id = self.store.adopt(agent.store, agent.id)
+            agent.store = self.store
         agent.position = (x, y)
-        self.agents.append(agent)
+        self.store.active[agent.id] = True
+        self.agent_count += 1
+        self._index_add(agent.id, (x, y))
+
+    def add_agents(self, personas, xs=None, ys=None):
+        """
+        Add one agent per entry of personas straight into the store, without creating
+        agent objects. Agents go to random cells unless xs and ys are given. Returns their ids.
+        """
+        n = len(personas)
+        if xs is None:
+            xs = self.np_rng.integers(0, self.width, n)
+            ys = self.np_rng.integers(0, self.height, n)
+        ids = self.store.add_many(personas, xs, ys)
+        self.agent_count += n
+        self._index_stale = True
+        return ids
+
+    def find_agent(self, name):
+        """The agent called name if it is still in the market, else None"""
+        i = self.store.find(name)
+        if i is None or not self.store.active[i]:
+            return None
+        return EconomicAgent.bind(self.store, i)
+
+    def _index_add(self, i, cell):
+        if not self._index_stale:
+            self.agents_by_cell.setdefault(cell, []).append(i)
+
+    def _index_remove(self, i, cell):
+        if self._index_stale:
+            return
+        bucket = self.agents_by_cell.get(cell)
+        if bucket is None:
+            return
+        bucket.remove(i)
+        if not bucket:
+            del self.agents_by_cell[cell]
+
+    def _ensure_index(self):
+        """Rebuild the spatial index from the position columns after bulk moves"""
+        if not self._index_stale:
+            return
+        store = self.store
+        ids = store.active_ids()
+        buckets = {}
+        for x, y, i in zip(store.x[ids].tolist(), store.y[ids].tolist(), ids.tolist()):
+            buckets.setdefault((x, y), []).append(i)
+        self.agents_by_cell = buckets
+        self._index_stale = False
 
     def move_agent(self, agent, direction):
         # Only move if agent is alive
@@ -52,7 +267,7 @@ class Market:
             return
             
         # Basic movement logic
-        x, y = agent.position
+        old = x, y = agent.position
         if direction == "UP":
             y = max(0, y - 1)
         elif direction == "DOWN":
@@ -61,7 +276,17 @@ class Market:
             x = max(0, x - 1)
         elif direction == "RIGHT":
             x = min(self.width - 1, x + 1)
-        agent.position = (x, y)
+        if (x, y) != old:
+            self._index_remove(agent.id, old)
+            agent.position = (x, y)
+            self._index_add(agent.id, (x, y))
+
+    def relocate_agents(self, ids, xs, ys):
+        """Move many agents (by id) to new cells at once; the spatial index is rebuilt when next needed"""
+        if len(ids):
+            self.store.x[ids] = xs
+            self.store.y[ids] = ys
+            self._index_stale = True
 
     def gather_resources(self, agent):
         """Gather red and green food, convert to energy"""
@@ -72,94 +297,153 @@ class Market:
         total_energy_gained = 0
         
         # Gather red food (50 energy each)
-        red_food = self.grid[y][x]["red_food"]
+        red_food = int(self.red_food[y, x])
         if red_food > 0:
-            energy_from_red = red_food * 50
+            energy_from_red = red_food * RED_FOOD_ENERGY
             agent.energy += energy_from_red
             total_energy_gained += energy_from_red
-            self.grid[y][x]["red_food"] = 0
-            print(f"🔴 {agent.name} gathered {red_food} red food (+{energy_from_red} energy)")
+            self.red_food[y, x] = 0
+            logger.debug("🔴 %s gathered %d red food (+%d energy)", agent.name, red_food, energy_from_red)
         
         # Gather green food (5 energy each)
-        green_food = self.grid[y][x]["green_food"]
+        green_food = int(self.green_food[y, x])
         if green_food > 0:
-            energy_from_green = green_food * 5
+            energy_from_green = green_food * GREEN_FOOD_ENERGY
             agent.energy += energy_from_green
             total_energy_gained += energy_from_green
-            self.grid[y][x]["green_food"] = 0
-            print(f"🟢 {agent.name} gathered {green_food} green food (+{energy_from_green} energy)")
+            self.green_food[y, x] = 0
+            logger.debug("🟢 %s gathered %d green food (+%d energy)", agent.name, green_food, energy_from_green)
         
+        self.food_energy -= total_energy_gained
+        if total_energy_gained:
+            self.food_changed([y * self.width + x])
         return total_energy_gained
 
     def nearby_market_context(self, agent):
         # Get information about nearby cells (including current cell)
         x, y = agent.position
+        x0, x1 = max(0, x - 1), min(self.width, x + 2)
+        y0, y1 = max(0, y - 1), min(self.height, y + 2)
+        # One slice per layer, converted to Python ints in a single pass
+        red = self.red_food[y0:y1, x0:x1].tolist()
+        green = self.green_food[y0:y1, x0:x1].tolist()
         context = {}
-        for dy in [-1, 0, 1]:
-            for dx in [-1, 0, 1]:
-                nx, ny = x + dx, y + dy
-                if 0 <= nx < self.width and 0 <= ny < self.height:
-                    context[(nx, ny)] = {
-                        "red_food": self.grid[ny][nx]["red_food"],
-                        "green_food": self.grid[ny][nx]["green_food"]
-                    }
+        for j, ny in enumerate(range(y0, y1)):
+            for i, nx in enumerate(range(x0, x1)):
+                context[(nx, ny)] = {
+                    "red_food": red[j][i],
+                    "green_food": green[j][i]
+                }
         return context
 
     def nearby_agents(self, agent, distance=2):
         # Find other living agents within the specified distance
+        x1, y1 = agent.position
+        x0, x_end = max(0, x1 - distance), min(self.width - 1, x1 + distance)
+        y0, y_end = max(0, y1 - distance), min(self.height - 1, y1 + distance)
+
+        store = self.store
+
+        # A full scan of the columns is cheaper when the window covers more cells than there are agents
+        if (x_end - x0 + 1) * (y_end - y0 + 1) > self.agent_count:
+            ids = store.living_ids()
+            near = ((np.abs(store.x[ids] - x1) <= distance) & (np.abs(store.y[ids] - y1) <= distance)
+                    & (ids != agent.id))
+            return [EconomicAgent.bind(store, i) for i in ids[near].tolist()]
+
+        # Otherwise only visit the buckets inside the window: O(k) in local agents
+        self._ensure_index()
         nearby = []
-        for other in self.agents:
-            if other != agent and other.is_alive:
-                x1, y1 = agent.position
-                x2, y2 = other.position
-                if abs(x1 - x2) <= distance and abs(y1 - y2) <= distance:
-                    nearby.append(other)
+        buckets = self.agents_by_cell
+        alive = store.alive
+        for y in range(y0, y_end + 1):
+            for x in range(x0, x_end + 1):
+                bucket = buckets.get((x, y))
+                if bucket:
+                    for i in bucket:
+                        if i != agent.id and alive[i]:
+                            nearby.append(EconomicAgent.bind(store, i))
         return nearby
 
     def replenish_resources(self, total_energy=None):
-        """Add food to maintain fixed energy input per turn"""
+        """
+        Add exactly total_energy of food (default: the fixed input per turn), split into
+        red and green units and placed by the replenisher with one np.add.at per food type
+        """
         if total_energy is None:
             total_energy = self.total_energy_added_per_turn
-            
-        energy_added = 0
-        attempts = 0
-        max_attempts = 50  # Prevent infinite loop
-        
-        while energy_added < total_energy and attempts < max_attempts:
-            x = random.randint(0, self.width - 1)
-            y = random.randint(0, self.height - 1)
-            
-            # Choose between red and green food (70% red, 30% green)
-            if random.random() < 0.7:
-                # Add red food (50 energy each)
-                if energy_added + 50 <= total_energy:
-                    self.grid[y][x]["red_food"] += 1
-                    energy_added += 50
-            else:
-                # Add green food (5 energy each)
-                if energy_added + 5 <= total_energy:
-                    self.grid[y][x]["green_food"] += 1
-                    energy_added += 5
-            
-            attempts += 1
-        
-        print(f"🌱 Market replenished with {energy_added} total energy")
+
+        budget = total_energy + self.replenish_leftover
+        red, green, self.replenish_leftover = split_energy(budget, RED_FOOD_ENERGY, GREEN_FOOD_ENERGY,
+                                                           self.red_share)
+        for layer, units in ((self.red_food, red), (self.green_food, green)):
+            if units:
+                cells = self.replenisher.cells(self, self.np_rng, units)
+                np.add.at(layer.reshape(-1), cells, 1)
+                self.food_changed(cells)
+
+        energy_added = red * RED_FOOD_ENERGY + green * GREEN_FOOD_ENERGY
+        self.food_energy += energy_added
+        self.food_in += energy_added
+        logger.info("🌱 Market replenished with %d total energy", energy_added)
         
+    def food_energy_grid(self):
+        """(height, width) array of the food energy on each cell"""
+        return np.tensordot(FOOD_ENERGY, self.food, axes=1)
+
+    def submit_trade(self, agent, offer):
+        """Queue agent's TRADE_OFFER decision; nothing moves until clear_trades"""
+        self.trade_book.submit(agent.id, offer["to"], offer["amount"])
+
+    def clear_trades(self, step, max_concurrency=1):
+        """Validate, evaluate and apply every offer queued this step. Returns a TradeResult per offer"""
+        return self.trade_book.clear(self, step, max_concurrency)
+
+    def record_trade(self, step, from_name, to_name, energy):
+        self.trade_history.append({"step": step, "from": from_name, "to": to_name, "energy": energy})
+        self.trade_count += 1
+
     def remove_dead_agents(self):
         """Remove dead agents from the simulation"""
-        alive_agents = [agent for agent in self.agents if agent.is_alive]
-        dead_count = len(self.agents) - len(alive_agents)
-        self.agents = alive_agents
-        return dead_count
+        store = self.store
+        n = store.count
+        dead = np.flatnonzero(store.active[:n] & ~store.alive[:n])
+        if len(dead):
+            store.active[dead] = False
+            self.agent_count -= len(dead)
+            for i, x, y in zip(dead.tolist(), store.x[dead].tolist(), store.y[dead].tolist()):
+                self._index_remove(i, (x, y))
+        return len(dead)
         
     def get_total_system_energy(self):
-        """Calculate total energy in the system (agents + food)"""
-        agent_energy = sum(agent.energy for agent in self.agents if agent.is_alive)
-        
-        food_energy = 0
-        for y in range(self.height):
-            for x in range(self.width):
-                food_energy += self.grid[y][x]["red_food"] * 50
-                food_energy += self.grid[y][x]["green_food"] * 5
-                
-        return agent_energy, food_energy, agent_energy + food_energy
\ No newline at end of file
+        """Total energy in the system (agents + food), from the running totals"""
+        agent_energy = self.store.energy_total
+        return agent_energy, self.food_energy, agent_energy + self.food_energy
+
+    def recount_system_energy(self):
+        """get_total_system_energy by a full scan of the agents and the food grid"""
+        agent_energy = self.store.recount_energy()
+        # Units per food type dotted with energy per unit
+        food_energy = int(FOOD_ENERGY @ self.food.reshape(len(FOOD_LAYERS), -1).sum(axis=1))
+        return agent_energy, food_energy, agent_energy + food_energy
+
+    def verify_energy_accounts(self):
+        """
+        Check the running totals against a full recount, and that energy is conserved:
+        everything in the system came in as food or starting agent energy, minus what
+        agents burned. Raises EnergyAccountingError on any mismatch.
+        """
+        tracked = self.get_total_system_energy()
+        counted = self.recount_system_energy()
+        if tracked != counted:
+            raise EnergyAccountingError(
+                f"Running totals (agents {tracked[0]}, food {tracked[1]}) differ from "
+                f"recount (agents {counted[0]}, food {counted[1]})"
+            )
+        expected = self.food_in + self.store.energy_in - self.store.burned
+        if counted[2] != expected:
+            raise EnergyAccountingError(
+                f"Energy not conserved: {counted[2]} in the system, expected {expected} "
+                f"({self.food_in} food in + {self.store.energy_in} agent energy in - {self.store.burned} burned)"
+            )
+        return counted
\ No newline at end of file
@@ -0,0 +1,93 @@
+# Local stand-in for the Gemini generateContent endpoint, for exercising the real client offline
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+AGENT_PATTERN = re.compile(r'<AGENT name="(\w+)">')
+ACTIONS = ["MOVE UP", "MOVE DOWN", "MOVE LEFT", "MOVE RIGHT", "GATHER"]
+
+
+def json_action():
+    action = random.choice(ACTIONS)
+    if action.startswith("MOVE "):
+        return {"action": "MOVE", "direction": action[5:]}
+    return {"action": action}
+
+
+class MockGeminiHandler(BaseHTTPRequestHandler):
+    # Keep connections alive so the client can reuse them. Headers and body go out in
+    # separate writes, so without TCP_NODELAY each reply on a reused connection would
+    # wait for the client's delayed ACK
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            throttled = server.quota_every and server.requests % server.quota_every == 0
+
+        if server.latency:
+            time.sleep(server.latency)
+
+        if throttled:
+            self._send(429, {"error": {"code": 429, "status": "RESOURCE_EXHAUSTED"}})
+            return
+
+        request = json.loads(body)
+        prompt = request["contents"][0]["parts"][0]["text"]
+        instruction = request.get("systemInstruction", {"parts": [{"text": ""}]})["parts"][0]["text"]
+        names = AGENT_PATTERN.findall(prompt)
+        if "JSON object" in instruction:
+            # JSON protocol (see protocol.py): one object, or one line per agent
+            text = "\n".join(json.dumps(dict({"agent": name} if name else {}, **json_action()))
+                              for name in names or [None])
+        elif names:
+            text = "\n".join(f'<AGENT name="{name}">\n<ACTION>\n{random.choice(ACTIONS)}\n</ACTION>\n</AGENT>'
+                             for name in names)
+        else:
+            text = f"<ACTION>\n{random.choice(ACTIONS)}\n</ACTION>"
+        self._send(200, {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}}]})
+
+    def _send(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def make_server(host="127.0.0.1", port=0, latency=0.0, quota_every=0):
+    """Create (but do not start) a mock server; port 0 picks a free port"""
+    server = ThreadingHTTPServer((host, port), MockGeminiHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.requests = 0
+    server.latency = latency
+    server.quota_every = quota_every
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock Gemini API server")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before each reply")
+    parser.add_argument("--quota-every", type=int, default=0,
+                        help="Answer every Nth request with HTTP 429 (0 = never)")
+    args = parser.parse_args()
+
+    server = make_server(port=args.port, latency=args.latency, quota_every=args.quota_every)
+    print(f"Mock Gemini API on http://127.0.0.1:{server.server_port} (set GEMINI_API_BASE to use it)")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
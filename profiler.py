@@ -0,0 +1,95 @@
+# Per-phase step timing with rolling percentiles, for the on-screen panel and headless export
+import json
+import threading
+import time
+import numpy as np
+
+# Phases in the order a step runs them. prompt/llm/parse split the one-agent-at-a-time
+# decide path; the concurrent, batched and batch-policy paths time "decide" as a whole.
+# "render" is timed by the UI loop, once per frame.
+PHASES = ["energy_loss", "remove_dead", "prompt", "llm", "parse", "decide", "execute", "trades",
+          "replenish", "stats", "telemetry", "step", "render"]
+PERCENTILES = (50, 95, 99)
+
+
+class PhaseProfiler:
+    """
+    Times step phases with perf_counter_ns and keeps the last `window` samples of
+    each in a ring buffer, so percentiles are rolling. Time spent in a phase is summed
+    over the step (add/lap) and becomes one sample at end_step; record() stores a
+    sample directly, which is how the UI thread reports render time.
+
+    Simulation only touches the profiler when one is given, so a run without one pays
+    a None check per phase.
+    """
+
+    def __init__(self, window=256):
+        self.window = window
+        self.steps = 0
+        self._samples = {}  # phase -> ring buffer of nanoseconds
+        self._counts = {}  # phase -> samples recorded so far
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def add(self, phase, ns):
+        """Add ns to phase for the current step"""
+        self._pending[phase] = self._pending.get(phase, 0) + ns
+
+    def lap(self, phase, start):
+        """Charge the time since start (a perf_counter_ns value) to phase and return the current time"""
+        now = time.perf_counter_ns()
+        self._pending[phase] = self._pending.get(phase, 0) + now - start
+        return now
+
+    def end_step(self):
+        """Turn this step's phase totals into one sample each"""
+        pending, self._pending = self._pending, {}
+        with self._lock:
+            for phase, ns in pending.items():
+                self._push(phase, ns)
+            self.steps += 1
+
+    def record(self, phase, ns):
+        """Store one sample for phase straight away (thread-safe)"""
+        with self._lock:
+            self._push(phase, ns)
+
+    def _push(self, phase, ns):
+        samples = self._samples.get(phase)
+        if samples is None:
+            samples = self._samples[phase] = np.zeros(self.window, dtype=np.int64)
+            self._counts[phase] = 0
+        samples[self._counts[phase] % self.window] = ns
+        self._counts[phase] += 1
+
+    def summary(self):
+        """
+        {phase: {"count", "last", "mean", "p50", "p95", "p99"}} over the rolling window,
+        times in milliseconds, phases in PHASES order
+        """
+        with self._lock:
+            data = {phase: (samples[:min(self._counts[phase], self.window)].copy(), self._counts[phase])
+                    for phase, samples in self._samples.items()}
+        result = {}
+        for phase in sorted(data, key=lambda p: PHASES.index(p) if p in PHASES else len(PHASES)):
+            samples, count = data[phase]
+            ms = samples / 1e6
+            stats = {"count": count, "last": float(ms[(count - 1) % self.window]), "mean": float(ms.mean())}
+            for p, value in zip(PERCENTILES, np.percentile(ms, PERCENTILES)):
+                stats[f"p{p}"] = float(value)
+            result[phase] = stats
+        return result
+
+    def export(self, path):
+        """Write the summary to path as JSON"""
+        with open(path, "w") as f:
+            json.dump({"window": self.window, "steps": self.steps, "phases": self.summary()}, f, indent=2)
+
+    def report_lines(self):
+        """The summary as aligned text lines, slowest phase (by p50) first"""
+        summary = self.summary()
+        order = sorted((p for p in summary if p != "step"), key=lambda p: -summary[p]["p50"])
+        if "step" in summary:
+            order.insert(0, "step")
+        return [f"{phase:<12} p50 {s['p50']:8.3f}  p95 {s['p95']:8.3f}  p99 {s['p99']:8.3f} ms  ({s['count']} samples)"
+                for phase, s in ((phase, summary[phase]) for phase in order)]
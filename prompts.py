@@ -0,0 +1,155 @@
+# Prompt building: static system instructions plus a compact per-step state encoding
+import threading
+
+# Sent once per call as the system instruction; never changes between steps
+DECISION_INSTRUCTIONS = """You are an economic agent in a grid simulation.
+Rules: you lose `loss` energy every turn and DIE at 0 energy. Gathering red food gives 50 energy, green food 5.
+State: `me` is your name, persona, position, energy and loss. `cells` is your 3x3 neighbourhood,
+rows top (y-1) to bottom (y+1), columns left to right, each cell red/green food count, # = off board,
+you are in the centre. `agents` lists nearby agents as name dx,dy energy persona.
+Actions: MOVE UP (y-1), MOVE DOWN, MOVE LEFT (x-1), MOVE RIGHT, GATHER (food on your cell), WAIT.
+Prefer red food; below 10 energy only seek food; with no food in view, move to explore.
+Reply <ACTION>
+[ACTION]
+</ACTION>
+or, to give energy to a nearby agent, <TRADE_OFFER>
+offer: [amount] energy
+to: [agent_name]
+</TRADE_OFFER>"""
+
+# Used when one request decides for several agents at once
+BATCH_DECISION_INSTRUCTIONS = DECISION_INSTRUCTIONS + """
+You are deciding for several agents. Each agent's state is wrapped in <AGENT name="...">...</AGENT>.
+Decide for each agent independently and reply with one block per agent, in the same order:
+<AGENT name="[agent_name]">
+[that agent's <ACTION> or <TRADE_OFFER> reply]
+</AGENT>"""
+
+TRADE_INSTRUCTIONS = """You are an economic agent in a grid simulation.
+You lose `loss` energy every turn and DIE at 0 energy. Another agent offers you energy;
+accept or reject it based on your energy needs and survival. Reply
+<DECISION>
+ACCEPT or REJECT
+</DECISION>
+<REASON>
+Brief explanation
+</REASON>"""
+
+# The same rules asking for one small JSON object per reply (see protocol.py), which
+# parses in a single pass; used when the response format is "json"
+JSON_REPLY_FORMAT = """Reply with one JSON object and nothing else:
+{"action": "MOVE", "direction": "UP|DOWN|LEFT|RIGHT"} or {"action": "GATHER"} or {"action": "WAIT"},
+or, to give energy to a nearby agent, {"action": "TRADE", "amount": [amount], "to": "[agent_name]"}"""
+
+JSON_DECISION_INSTRUCTIONS = DECISION_INSTRUCTIONS[:DECISION_INSTRUCTIONS.index("Reply <ACTION>")] + JSON_REPLY_FORMAT
+
+JSON_BATCH_DECISION_INSTRUCTIONS = JSON_DECISION_INSTRUCTIONS + """
+You are deciding for several agents. Each agent's state is wrapped in <AGENT name="...">...</AGENT>.
+Decide for each agent independently and reply with one JSON object per line, in the same order,
+each with an extra "agent" field naming the agent, e.g. {"agent": "Agent_1", "action": "GATHER"}"""
+
+JSON_TRADE_INSTRUCTIONS = TRADE_INSTRUCTIONS[:TRADE_INSTRUCTIONS.index("Reply")] + \
+    """Reply with one JSON object and nothing else: {"accept": true or false, "reason": "brief explanation"}"""
+
+# Which of the two reply formats the model is asked for: "xml" or "json"
+RESPONSE_FORMATS = ("xml", "json")
+response_format = "xml"
+
+
+def set_response_format(name):
+    global response_format
+    if name not in RESPONSE_FORMATS:
+        raise ValueError(f"Unknown response format {name!r}; expected one of {RESPONSE_FORMATS}")
+    response_format = name
+
+
+def decision_instructions():
+    return JSON_DECISION_INSTRUCTIONS if response_format == "json" else DECISION_INSTRUCTIONS
+
+
+def batch_decision_instructions():
+    return JSON_BATCH_DECISION_INSTRUCTIONS if response_format == "json" else BATCH_DECISION_INSTRUCTIONS
+
+
+def trade_instructions():
+    return JSON_TRADE_INSTRUCTIONS if response_format == "json" else TRADE_INSTRUCTIONS
+
+
+def encode_decision_state(agent, market_context, nearby_agents, width, height):
+    """Encode what one agent can see this step as a few short lines"""
+    x, y = agent.position
+    lines = [
+        f"board: {width}x{height}",
+        f"me: {agent.name} {agent.persona} pos={x},{y} energy={agent.energy} loss={agent.energy_loss_per_turn}",
+        "cells:",
+    ]
+    for ny in (y - 1, y, y + 1):
+        row = []
+        for nx in (x - 1, x, x + 1):
+            cell = market_context.get((nx, ny))
+            row.append("#" if cell is None else f"{cell['red_food']}/{cell['green_food']}")
+        lines.append(" ".join(row))
+
+    others = [a for a in nearby_agents if a.is_alive]
+    if others:
+        lines.append("agents:")
+        for other in others:
+            ox, oy = other.position
+            lines.append(f"{other.name} {ox - x:+d},{oy - y:+d} {other.energy} {other.persona}")
+    else:
+        lines.append("agents: none")
+    return "\n".join(lines)
+
+
+def encode_batch_state(named_states):
+    """Wrap several (agent_name, state) pairs into one batched prompt"""
+    return "\n".join(f'<AGENT name="{name}">\n{state}\n</AGENT>' for name, state in named_states)
+
+
+def encode_trade_state(agent, offer, from_agent):
+    return (
+        f"me: {agent.name} {agent.persona} energy={agent.energy} loss={agent.energy_loss_per_turn}\n"
+        f"offer: {from_agent.name} ({from_agent.persona}) gives you {offer['amount']} energy"
+    )
+
+
+class PromptStats:
+    """Running size statistics for prompts sent to the model"""
+
+    # Rough characters-per-token ratio for English text
+    CHARS_PER_TOKEN = 4
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.calls = 0
+        self.total_chars = 0
+        self.state_chars = 0
+        self.max_chars = 0
+
+    def record(self, system_instruction, state):
+        """Record one call; state is the per-step part, system_instruction the static part"""
+        size = len(system_instruction) + len(state)
+        with self._lock:
+            self.calls += 1
+            self.total_chars += size
+            self.state_chars += len(state)
+            self.max_chars = max(self.max_chars, size)
+        return size
+
+    def summary(self):
+        calls = self.calls or 1
+        avg_chars = self.total_chars / calls
+        return {
+            "calls": self.calls,
+            "avg_chars": avg_chars,
+            "avg_state_chars": self.state_chars / calls,
+            "max_chars": self.max_chars,
+            "avg_tokens_est": avg_chars / self.CHARS_PER_TOKEN,
+        }
+
+
+# Size of every prompt (system instruction + state) built for call_gemini
+prompt_stats = PromptStats()
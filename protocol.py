@@ -0,0 +1,129 @@
+# Parsing model replies: a validated JSON protocol, with the original XML tags as the fallback
+import json
+import re
+
+# Moves a decision may name, and every action the simulation executes
+DIRECTIONS = ("UP", "DOWN", "LEFT", "RIGHT")
+ACTIONS = ("MOVE UP", "MOVE DOWN", "MOVE LEFT", "MOVE RIGHT", "GATHER", "WAIT")
+
+# XML replies: the first complete <ACTION> or <TRADE_OFFER> element, and the fields inside
+DECISION_TAG_PATTERN = re.compile(r"<(ACTION|TRADE_OFFER)>\s*(.*?)\s*</\1>", re.DOTALL)
+OFFER_PATTERN = re.compile(r"offer:\s*(\d+)\s*energy")
+TO_PATTERN = re.compile(r"to:\s*(\w+)")
+TRADE_DECISION_PATTERN = re.compile(r"<DECISION>\s*(.*?)\s*</DECISION>", re.DOTALL)
+REASON_PATTERN = re.compile(r"<REASON>\s*(.*?)\s*</REASON>", re.DOTALL)
+AGENT_BLOCK_PATTERN = re.compile(r'<AGENT name="(\w+)">(.*?)</AGENT>', re.DOTALL)
+
+NO_REASON = "(No explanation provided)"
+
+# Replies parsed so far: as JSON, through the XML fallback, and neither
+parse_stats = {"json": 0, "xml": 0, "failed": 0}
+
+_decoder = json.JSONDecoder()
+
+
+def _load_object(text):
+    """The JSON object starting at the first "{" in text, or None"""
+    start = text.find("{")
+    if start < 0:
+        return None
+    try:
+        value, _ = _decoder.raw_decode(text, start)
+    except ValueError:
+        return None
+    return value if isinstance(value, dict) else None
+
+
+def decision_from_json(obj):
+    """
+    Validate one decoded decision object and turn it into a decision dict, or None:
+    {"action": "MOVE", "direction": "UP"}, {"action": "GATHER"}, {"action": "WAIT"}
+    or {"action": "TRADE", "amount": 10, "to": "Agent_2"}
+    """
+    action = obj.get("action")
+    if not isinstance(action, str):
+        return None
+    action = action.strip().upper()
+    if action == "TRADE":
+        amount, to = obj.get("amount"), obj.get("to")
+        if isinstance(amount, int) and not isinstance(amount, bool) and amount >= 0 \
+                and isinstance(to, str) and to:
+            return {"type": "TRADE_OFFER", "amount": amount, "to": to}
+        return None
+    if action == "MOVE":
+        direction = obj.get("direction")
+        if not isinstance(direction, str) or direction.strip().upper() not in DIRECTIONS:
+            return None
+        action = f"MOVE {direction.strip().upper()}"
+    if action in ACTIONS:
+        return {"type": "ACTION", "action": action}
+    return None
+
+
+def decision_from_xml(text):
+    """The first valid <TRADE_OFFER> in text, else its first valid <ACTION>, else None"""
+    action = None
+    for match in DECISION_TAG_PATTERN.finditer(text):
+        tag, body = match.groups()
+        if tag == "TRADE_OFFER":
+            offer = OFFER_PATTERN.search(body)
+            to = TO_PATTERN.search(body)
+            if offer and to:
+                return {"type": "TRADE_OFFER", "amount": int(offer.group(1)), "to": to.group(1)}
+        elif action is None and body.upper() in ACTIONS:
+            action = {"type": "ACTION", "action": body.upper()}
+    return action
+
+
+def parse_decision(text):
+    """
+    Parse a decision reply in one pass: a JSON object if the reply holds one, else the
+    XML tags. Returns the decision dict or None, and counts the outcome in parse_stats.
+    """
+    obj = _load_object(text)
+    if obj is not None:
+        decision = decision_from_json(obj)
+        if decision is not None:
+            parse_stats["json"] += 1
+            return decision
+    decision = decision_from_xml(text)
+    parse_stats["xml" if decision is not None else "failed"] += 1
+    return decision
+
+
+def parse_trade_reply(text):
+    """
+    Parse a reply to a trade offer: {"accept": true, "reason": "..."} or the
+    <DECISION>/<REASON> tags. Returns (accepted, reason); anything unreadable is a rejection.
+    """
+    obj = _load_object(text)
+    if obj is not None and isinstance(obj.get("accept"), bool):
+        parse_stats["json"] += 1
+        reason = obj.get("reason")
+        return obj["accept"], reason.strip() if isinstance(reason, str) and reason.strip() else NO_REASON
+
+    decision = TRADE_DECISION_PATTERN.search(text)
+    reason = REASON_PATTERN.search(text)
+    parse_stats["xml" if decision else "failed"] += 1
+    accepted = bool(decision) and decision.group(1).strip().upper() == "ACCEPT"
+    return accepted, reason.group(1).strip() if reason else NO_REASON
+
+
+def parse_batch(text):
+    """
+    Split a batched reply into {agent_name: (reply_text, decision or None)}. JSON replies
+    are one object per line with an "agent" field; XML replies are <AGENT name="..."> blocks.
+    """
+    replies = {}
+    for line in text.splitlines():
+        obj = _load_object(line)
+        if obj is not None and isinstance(obj.get("agent"), str):
+            decision = decision_from_json(obj)
+            parse_stats["json" if decision is not None else "failed"] += 1
+            replies[obj["agent"]] = (line, decision)
+    if replies:
+        return replies
+    for name, body in AGENT_BLOCK_PATTERN.findall(text):
+        replies[name] = (body, parse_decision(body))
+    return replies
+
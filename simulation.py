@@ -0,0 +1,346 @@
+# Headless simulation engine for the energy-based economic simulation
+import logging
+import time
+import numpy as np
+import llm_model
+from market import Market
+from economic_agent import EconomicAgent
+from batch_policy import ACTION_NAMES, agent_arrays, batch_lose_energy, batch_execute
+from llm_dispatch import decide_all, decide_batched
+from trades import TRADE_ACCEPTED, TRADE_REJECTED
+from prompts import decision_instructions
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PERSONAS = ["Risk-averse", "Risk-averse", "Risk-averse", "Risk-averse"]
+DEFAULT_POSITIONS = [(2, 2), (6, 2), (2, 6), (6, 6)]
+
+
+def create_simulation(width=9, height=9, personas=None, positions=None, seed=None, energy_per_turn=100,
+                      trade_history_limit=None, check_energy=False, replenisher=None, **kwargs):
+    """Build a market populated with one agent per persona and wrap it in a Simulation"""
+    personas = DEFAULT_PERSONAS if personas is None else personas
+    market = Market(width=width, height=height, seed=seed, energy_per_turn=energy_per_turn,
+                    trade_history_limit=trade_history_limit, check_energy=check_energy,
+                    replenisher=replenisher)
+
+    # Default positions keep the 4 original agents apart; extra agents are placed randomly
+    if positions is None:
+        positions = DEFAULT_POSITIONS if len(personas) <= len(DEFAULT_POSITIONS) else []
+
+    placed = min(len(positions), len(personas))
+    for i in range(placed):
+        market.add_agent(EconomicAgent(f"Agent_{i+1}", personas[i]), positions[i][0], positions[i][1])
+    # The rest go straight into the agent store in one call, named Agent_<n> by id
+    if len(personas) > placed:
+        market.add_agents(personas[placed:])
+
+    return Simulation(market, **kwargs)
+
+
+class Simulation:
+    """
+    Owns the step loop: energy loss, decisions, execution, replenishment and stats.
+    Has no knowledge of pygame, so it can run headless as fast as the CPU allows.
+
+    With a BatchPolicy the per-agent LLM path is bypassed: decisions, moves,
+    gathers and energy loss are applied to all agents at once over NumPy arrays.
+
+    With max_concurrency > 1 every agent decides against the same market snapshot
+    and the LLM calls run concurrently; decisions are then executed in agent order.
+    With batch_size > 1 one request decides for up to batch_size agents at a time.
+
+    TRADE_OFFER decisions are queued on the market and cleared together after every
+    agent has acted (see trades.TradeBook).
+
+    Progress goes to the "simulation" logger: step-level lines at INFO, per-agent
+    lines at DEBUG. A TelemetryRecorder, if given, gets one row per step, and a
+    PhaseProfiler, if given, the time spent in each phase of it.
+    """
+
+    def __init__(self, market, replenish_interval=10, stats_interval=5, verbose=True, policy=None,
+                 max_concurrency=1, batch_size=1, telemetry=None, profiler=None):
+        self.market = market
+        self.policy = policy
+        self.max_concurrency = max_concurrency
+        self.batch_size = batch_size
+        self.replenish_interval = replenish_interval
+        self.stats_interval = stats_interval
+        self.verbose = verbose
+        self.step_count = 0
+        self.finished = False
+        self.telemetry = telemetry
+        self.profiler = profiler
+        if telemetry is not None:
+            telemetry.start(market)
+
+    def log(self, message, *args, level=logging.INFO):
+        """Log lazily: message is only formatted when the level is enabled"""
+        if self.verbose and logger.isEnabledFor(level):
+            logger.log(level, message, *args)
+
+    def debug(self, message, *args):
+        self.log(message, *args, level=logging.DEBUG)
+
+    def step(self):
+        """Run a single simulation step. Returns False once every agent has died"""
+        if self.finished:
+            return False
+
+        # Group logged model responses by step, so a replay can hand them back per step
+        if llm_model.decision_log is not None:
+            llm_model.decision_log.begin_step(self.step_count)
+
+        self.log("\n=== Step %d ===", self.step_count + 1)
+
+        prof = self.profiler
+        step_start = t = time.perf_counter_ns() if prof is not None else 0
+
+        self.lose_energy()
+        if prof is not None:
+            t = prof.lap("energy_loss", t)
+
+        # Remove dead agents
+        dead_count = self.market.remove_dead_agents()
+        if prof is not None:
+            t = prof.lap("remove_dead", t)
+        if dead_count > 0:
+            self.log("💀 %d agent(s) died this turn", dead_count)
+
+        # Check if all agents are dead
+        if not self.market.agent_count:
+            self.log("💀 All agents have died! Simulation ending.")
+            self.finished = True
+            return False
+
+        self.decide_and_execute()
+        if prof is not None:
+            t = time.perf_counter_ns()
+        self.clear_trades()
+        if prof is not None:
+            t = prof.lap("trades", t)
+
+        # Replenish resources every N steps
+        if self.step_count % self.replenish_interval == 0:
+            self.market.replenish_resources()  # Uses default energy input per turn
+            if prof is not None:
+                t = prof.lap("replenish", t)
+
+        # Print system energy status every N steps
+        if self.step_count % self.stats_interval == 0:
+            self.report_stats()
+            if prof is not None:
+                t = prof.lap("stats", t)
+
+        # Debug mode: recount everything and check energy is conserved
+        if self.market.check_energy:
+            self.market.verify_energy_accounts()
+
+        if self.telemetry is not None:
+            self.telemetry.end_step(self.step_count, self.market)
+            if prof is not None:
+                prof.lap("telemetry", t)
+        if prof is not None:
+            prof.add("step", time.perf_counter_ns() - step_start)
+            prof.end_step()
+        self.step_count += 1
+        return True
+
+    def run(self, max_steps):
+        """Run up to max_steps steps, stopping early if all agents die. Returns steps run"""
+        steps_run = 0
+        while steps_run < max_steps and self.step():
+            steps_run += 1
+        return steps_run
+
+    def lose_energy(self):
+        # ENERGY LOSS: All agents lose energy per turn
+        self.debug("⚡ Agents lose energy...")
+        if self.policy is not None:
+            batch_lose_energy(self.market.store)
+            return
+        for agent in self.market.agents:
+            if agent.is_alive:
+                old_energy = agent.energy
+                agent.lose_energy_per_turn()
+                if agent.is_alive:
+                    self.debug("  %s: %d → %d energy", agent.name, old_energy, agent.energy)
+
+    def decide_and_execute(self):
+        if self.policy is not None:
+            self.decide_and_execute_batch()
+            return
+
+        market = self.market
+        prof = self.profiler
+        t = time.perf_counter_ns() if prof is not None else 0
+        if self.batch_size > 1 or self.max_concurrency > 1:
+            if self.batch_size > 1:
+                # Several agents per request, all deciding from one snapshot
+                results = decide_batched(market.agents, market, self.batch_size, self.max_concurrency)
+            else:
+                # Decide concurrently from one snapshot, then execute in agent order
+                results = decide_all(market.agents, market, self.max_concurrency)
+            if prof is not None:
+                t = prof.lap("decide", t)
+            for agent, decision, raw_response in results:
+                self.execute_decision(agent, decision, raw_response)
+            if prof is not None:
+                prof.lap("execute", t)
+            return
+
+        # Process each living agent
+        for agent in market.agents:
+            if not agent.is_alive:
+                continue
+
+            # DEBUG: Show what agent sees at their current position
+            x, y = agent.position
+            self.debug("🔍 %s at %s: Red food: %d, Green food: %d, Energy: %d", agent.name, agent.position,
+                       market.red_food[y, x], market.green_food[y, x], agent.energy)
+
+            # Get decision from the agent
+            if prof is None:
+                decision, raw_response = agent.decide_action(market)
+                self.execute_decision(agent, decision, raw_response)
+                continue
+
+            # Same as decide_action, with prompt building, the model call and parsing timed apart
+            t = time.perf_counter_ns()
+            prompt = agent.build_decision_prompt(market)
+            t = prof.lap("prompt", t)
+            raw_response = llm_model.call_gemini(prompt, decision_instructions())
+            t = prof.lap("llm", t)
+            decision = agent.apply_decision(raw_response)
+            t = prof.lap("parse", t)
+            self.execute_decision(agent, decision, raw_response)
+            prof.lap("execute", t)
+
+    def execute_decision(self, agent, decision, raw_response):
+        # Skip dead agents
+        if decision["type"] == "ACTION" and decision.get("action") == "DEAD":
+            return
+
+        # Debug output - limited to first 100 chars for readability
+        if self.verbose and logger.isEnabledFor(logging.DEBUG):
+            debug_response = raw_response[:100] + "..." if len(raw_response) > 100 else raw_response
+            self.debug("\n%s (%s) raw response (truncated):\n%s", agent.name, agent.persona, debug_response)
+
+        self.execute(agent, decision)
+
+    def decide_and_execute_batch(self):
+        """Decide and apply actions for all living agents with the batch policy"""
+        market = self.market
+        ids = market.store.living_ids()
+        prof = self.profiler
+        t = time.perf_counter_ns() if prof is not None else 0
+        xs, ys, energies, _ = agent_arrays(market.store, ids)
+        actions = self.policy.decide(market, xs, ys, energies)
+        if prof is not None:
+            t = prof.lap("decide", t)
+        gathered = batch_execute(market, ids, actions, xs, ys, energies)
+        if self.telemetry is not None:
+            self.telemetry.record_actions(ids, actions)
+        if prof is not None:
+            prof.lap("execute", t)
+
+        if self.verbose and logger.isEnabledFor(logging.INFO):
+            counts = np.bincount(actions, minlength=len(ACTION_NAMES))
+            summary = ", ".join(f"{name}: {count}" for name, count in zip(ACTION_NAMES, counts.tolist()) if count)
+            self.log("🤖 Batch actions - %s; %d energy gathered", summary, gathered)
+
+    def execute(self, agent, decision):
+        """Apply a parsed decision for one agent"""
+        market = self.market
+
+        if decision["type"] == "ACTION":
+            action = decision["action"]
+            if self.telemetry is not None:
+                self.telemetry.record_action(agent, action)
+            self.debug("%s (%s) decided: %s", agent.name, agent.persona, action)
+
+            if action.startswith("MOVE"):
+                direction = action.split()[-1]
+                old_pos = agent.position
+                market.move_agent(agent, direction)
+                if agent.position != old_pos:
+                    self.debug("🚶 %s moved %s from %s to %s", agent.name, direction, old_pos, agent.position)
+                else:
+                    self.debug("🚫 %s tried to move %s but hit boundary at %s", agent.name, direction, old_pos)
+
+            elif action == "GATHER":
+                energy_gained = market.gather_resources(agent)
+                if energy_gained > 0:
+                    self.debug("⚡ %s gained %d energy (total: %d)", agent.name, energy_gained, agent.energy)
+                else:
+                    self.debug("❌ %s found no food to gather", agent.name)
+
+            elif action == "WAIT":
+                self.debug("⏳ %s waits", agent.name)
+
+        elif decision["type"] == "TRADE_OFFER":
+            if self.telemetry is not None:
+                self.telemetry.record_action(agent, "TRADE")
+            # Offers are settled together once every agent has acted
+            self.debug("💬 %s offers %d energy to %s", agent.name, decision["amount"], decision["to"])
+            market.submit_trade(agent, decision)
+
+    def clear_trades(self):
+        """Settle the trade offers made this step, all at once"""
+        market = self.market
+        if not len(market.trade_book):
+            return
+        for trade in market.clear_trades(self.step_count, self.max_concurrency):
+            if trade.status == TRADE_ACCEPTED:
+                self.debug("✅ %s accepted %d energy from %s: %s", trade.target, trade.amount, trade.sender,
+                           trade.reason)
+                if self.telemetry is not None:
+                    self.telemetry.record_trade(trade.amount)
+            elif trade.status == TRADE_REJECTED:
+                self.debug("❌ %s rejected %d energy from %s: %s", trade.target, trade.amount, trade.sender,
+                           trade.reason)
+            else:
+                self.debug("❌ Trade from %s to %s failed: %s", trade.sender, trade.target, trade.status)
+
+    def report_stats(self):
+        agent_energy, food_energy, total_energy = self.market.get_total_system_energy()
+        alive_count = len(self.market.store.living_ids())
+        self.log("📊 System Status: %d agents, %d agent energy, %d food energy, %d total",
+                 alive_count, agent_energy, food_energy, total_energy)
+
+    def print_summary(self):
+        market = self.market
+        print("\n=== Simulation Ended ===")
+        print(f"Total steps: {self.step_count}")
+        print("\nFinal Agent States:")
+
+        for agent in market.agents:
+            status = f"Energy: {agent.energy}" if agent.is_alive else "DEAD"
+            print(f"{agent.name} ({agent.persona}) - {status}")
+
+        # Energy system statistics
+        if market.agents:
+            alive_agents = [a for a in market.agents if a.is_alive]
+            if alive_agents:
+                avg_energy = sum(a.energy for a in alive_agents) / len(alive_agents)
+                print(f"\nSurviving agents: {len(alive_agents)}")
+                print(f"Average energy: {avg_energy:.1f}")
+
+        # Trade statistics
+        if market.trade_count:
+            print("\nTrade Statistics:")
+            print(f"Total trades: {market.trade_count}")
+            if len(market.trade_history) < market.trade_count:
+                print(f"(per-agent counts cover the last {len(market.trade_history)} trades)")
+
+            # Count trades by agent
+            agent_trades = {}
+            for trade in market.trade_history:
+                agent_trades[trade["from"]] = agent_trades.get(trade["from"], 0) + 1
+
+            for agent_name, count in agent_trades.items():
+                print(f"{agent_name} initiated {count} trades")
+
+        # Final system energy
+        agent_energy, food_energy, total_energy = market.get_total_system_energy()
+        print(f"\nFinal System Energy: {total_energy} (Agents: {agent_energy}, Food: {food_energy})")
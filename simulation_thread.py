@@ -0,0 +1,111 @@
+# Runs a Simulation on a worker thread and hands immutable step snapshots to the UI
+import queue
+import threading
+
+
+class MarketSnapshot:
+    """Read-only copy of everything the visualization draws for one step"""
+
+    def __init__(self, market, step):
+        self.step = step
+        self.width = market.width
+        self.height = market.height
+        self.total_energy_added_per_turn = market.total_energy_added_per_turn
+        self.food = market.food.copy()
+        self.food.flags.writeable = False
+        self.red_food = self.food[0]
+        self.green_food = self.food[1]
+        # Agents as array columns, copied without creating a Python object per agent
+        self.columns = market.agent_columns()
+        self._system_energy = market.get_total_system_energy()
+
+    def agent_columns(self):
+        return self.columns
+
+    def get_total_system_energy(self):
+        return self._system_energy
+
+
+class SimulationWorker(threading.Thread):
+    """
+    Steps the simulation on its own thread and publishes a MarketSnapshot after each
+    step to a bounded queue. If the UI falls behind, the oldest snapshot is dropped, so
+    the simulation never waits on the display. The UI sends PAUSE, STEP, SPEED_UP,
+    SPEED_DOWN and STOP over the command queue.
+    """
+
+    def __init__(self, sim, max_steps=1000, step_delay=1.0, snapshot_queue_size=2):
+        super().__init__(name="simulation", daemon=True)
+        self.sim = sim
+        self.max_steps = max_steps
+        self.step_delay = step_delay  # seconds per step
+        self.snapshots = queue.Queue(maxsize=snapshot_queue_size)
+        self.commands = queue.Queue()
+        self.paused = False
+        self.dropped_snapshots = 0
+
+    def send(self, command):
+        """Called from the UI thread"""
+        self.commands.put(command)
+
+    def publish(self):
+        snapshot = MarketSnapshot(self.sim.market, self.sim.step_count)
+        while True:
+            try:
+                self.snapshots.put_nowait(snapshot)
+                return
+            except queue.Full:
+                # Make room by discarding the oldest snapshot the UI has not consumed
+                try:
+                    self.snapshots.get_nowait()
+                    self.dropped_snapshots += 1
+                except queue.Empty:
+                    pass
+
+    def latest_snapshot(self):
+        """Called from the UI thread: newest published snapshot, or None if nothing new"""
+        snapshot = None
+        while True:
+            try:
+                snapshot = self.snapshots.get_nowait()
+            except queue.Empty:
+                return snapshot
+
+    def handle(self, command):
+        """Apply one command. Returns (keep_running, step_requested)"""
+        if command == "STOP":
+            return False, False
+        if command == "PAUSE":
+            self.paused = not self.paused
+            print(f"Simulation {'paused' if self.paused else 'resumed'}")
+        elif command == "STEP":
+            return True, True
+        elif command == "SPEED_UP":
+            self.step_delay = max(0.2, self.step_delay - 0.2)
+            print(f"Speed increased: {1/self.step_delay:.1f} steps/second")
+        elif command == "SPEED_DOWN":
+            self.step_delay = min(5.0, self.step_delay + 0.2)
+            print(f"Speed decreased: {1/self.step_delay:.1f} steps/second")
+        return True, False
+
+    def run(self):
+        self.publish()
+        while self.sim.step_count <= self.max_steps:
+            # Wait out the step delay (or indefinitely while paused) but wake up on commands
+            step_requested = False
+            try:
+                command = self.commands.get(timeout=None if self.paused else self.step_delay)
+                running, step_requested = self.handle(command)
+                if not running:
+                    return
+                if not step_requested:
+                    continue
+            except queue.Empty:
+                pass
+
+            if self.paused and not step_requested:
+                continue
+            if not self.sim.step():
+                self.publish()
+                return
+            self.publish()
@@ -0,0 +1,231 @@
+# Columnar per-step telemetry: buffered in preallocated arrays, flushed in chunks to NPZ or Parquet
+import glob
+import os
+import numpy as np
+import llm_model
+from batch_policy import ACTION_NAMES
+from market import FOOD_ENERGY, FOOD_LAYERS
+
+# Action codes recorded per agent: the batch policy codes plus TRADE; NO_ACTION when
+# the agent did not act that step (dead, or not yet decided)
+ACTION_TRADE = len(ACTION_NAMES)
+RECORDED_ACTIONS = ACTION_NAMES + ["TRADE"]
+ACTION_CODES = {name: code for code, name in enumerate(RECORDED_ACTIONS)}
+NO_ACTION = -1
+ACTION_COLUMNS = [f"action_{name.lower().replace(' ', '_')}" for name in RECORDED_ACTIONS]
+
+# One value per step
+STEP_COLUMNS = {
+    "step": np.int32,
+    "alive": np.int32,
+    "total_agent_energy": np.int64,
+    "red_food": np.int64,
+    "green_food": np.int64,
+    "food_energy": np.int64,
+    "trades": np.int32,
+    "trade_energy": np.int64,
+    "llm_calls": np.int32,
+    "llm_latency_total": np.float64,
+    "llm_latency_max": np.float64,
+    **{name: np.int32 for name in ACTION_COLUMNS},
+}
+
+# One value per agent per step, in the order agents were registered
+AGENT_COLUMNS = {
+    "energy": np.int64,
+    "x": np.int32,
+    "y": np.int32,
+    "action": np.int8,
+}
+
+
+def _parquet():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+        return pyarrow
+    except ImportError:
+        return None
+
+
+class TelemetryRecorder:
+    """
+    Records one row per simulation step into preallocated column arrays and flushes
+    every chunk_steps rows. Step columns hold totals; agent columns are (steps, agents)
+    matrices, one column per agent in the market at start(), in id order. Dead agents
+    keep energy 0 and position -1.
+
+    A path ending in .parquet is written as one Parquet file with a row group per
+    chunk (needs pyarrow). Anything else is written as numbered NPZ chunk files,
+    <path>-00000.npz, <path>-00001.npz, ...; load_telemetry() joins them back up.
+    """
+
+    def __init__(self, path, chunk_steps=256):
+        self.path = path
+        self.chunk_steps = chunk_steps
+        self.parquet = path.endswith(".parquet")
+        if self.parquet and _parquet() is None:
+            raise ImportError("Writing Parquet telemetry requires pyarrow; use an .npz path instead")
+        self.agent_names = []
+        self.rows = 0
+        self.buffered = 0
+        self.chunks_written = 0
+        self._writer = None
+        self._step_trades = 0
+        self._step_trade_energy = 0
+
+    def start(self, market):
+        """Register the market's agents and allocate the first chunk"""
+        store = market.store
+        ids = store.active_ids()
+        self.agent_names = [store.name(i) for i in ids.tolist()]
+        # Store id -> telemetry column; agents added later are not recorded
+        self.columns = np.full(store.count, -1, dtype=np.intp)
+        self.columns[ids] = np.arange(len(ids))
+        n = len(ids)
+        self.steps = {name: np.zeros(self.chunk_steps, dtype=dtype) for name, dtype in STEP_COLUMNS.items()}
+        self.agent_data = {name: np.zeros((self.chunk_steps, n), dtype=dtype)
+                           for name, dtype in AGENT_COLUMNS.items()}
+        self._actions = np.full(n, NO_ACTION, dtype=np.int8)
+        llm_model.call_timer.drain()  # Only count LLM calls made from here on
+
+    def record_action(self, agent, action):
+        """Record one agent's action this step, by name ("MOVE UP", "GATHER", "TRADE", ...)"""
+        if agent.id < len(self.columns) and self.columns[agent.id] >= 0:
+            self._actions[self.columns[agent.id]] = ACTION_CODES.get(action, NO_ACTION)
+
+    def record_actions(self, ids, actions):
+        """Record a batch policy's action codes for the agents with the given store ids"""
+        columns = np.full(len(ids), -1, dtype=np.intp)
+        inside = ids < len(self.columns)
+        columns[inside] = self.columns[ids[inside]]
+        known = columns >= 0
+        self._actions[columns[known]] = actions[known]
+
+    def record_trade(self, amount):
+        self._step_trades += 1
+        self._step_trade_energy += amount
+
+    def end_step(self, step, market):
+        """Close out the row for this step and flush if the chunk is full"""
+        row = self.buffered
+        steps = self.steps
+        store = market.store
+        ids = store.living_ids()
+        ids = ids[ids < len(self.columns)]
+        ids = ids[self.columns[ids] >= 0]
+        indices = self.columns[ids]
+        energies = store.energy[ids]
+
+        energy_row = self.agent_data["energy"][row]
+        x_row = self.agent_data["x"][row]
+        y_row = self.agent_data["y"][row]
+        energy_row[:] = 0
+        x_row[:] = -1
+        y_row[:] = -1
+        energy_row[indices] = energies
+        x_row[indices] = store.x[ids]
+        y_row[indices] = store.y[ids]
+        self.agent_data["action"][row] = self._actions
+
+        food_units = market.food.reshape(len(FOOD_LAYERS), -1).sum(axis=1)
+        calls, latency_total, latency_max = llm_model.call_timer.drain()
+        steps["step"][row] = step
+        steps["alive"][row] = len(ids)
+        steps["total_agent_energy"][row] = energies.sum()
+        steps["red_food"][row] = food_units[FOOD_LAYERS["red_food"]]
+        steps["green_food"][row] = food_units[FOOD_LAYERS["green_food"]]
+        steps["food_energy"][row] = FOOD_ENERGY @ food_units
+        steps["trades"][row] = self._step_trades
+        steps["trade_energy"][row] = self._step_trade_energy
+        steps["llm_calls"][row] = calls
+        steps["llm_latency_total"][row] = latency_total
+        steps["llm_latency_max"][row] = latency_max
+        counts = np.bincount(self._actions[self._actions >= 0], minlength=len(RECORDED_ACTIONS))
+        for name, count in zip(ACTION_COLUMNS, counts):
+            steps[name][row] = count
+
+        self._actions[:] = NO_ACTION
+        self._step_trades = 0
+        self._step_trade_energy = 0
+        self.rows += 1
+        self.buffered += 1
+        if self.buffered == self.chunk_steps:
+            self.flush()
+
+    def flush(self):
+        """Write any buffered rows as one chunk"""
+        count = self.buffered
+        if count == 0:
+            return
+        columns = {name: values[:count] for name, values in self.steps.items()}
+        columns.update((f"agent_{name}", values[:count]) for name, values in self.agent_data.items())
+
+        if self.parquet:
+            self._write_parquet(columns, count)
+        else:
+            np.savez(f"{self.path}-{self.chunks_written:05d}.npz",
+                     agent_names=np.array(self.agent_names), **columns)
+        self.chunks_written += 1
+        self.buffered = 0
+
+    def _write_parquet(self, columns, count):
+        pa = _parquet()
+        arrays = {}
+        for name, values in columns.items():
+            if values.ndim == 1:
+                arrays[name] = pa.array(values)
+            else:
+                # Per-agent matrices become fixed-size list columns, one list per step
+                arrays[name] = pa.FixedSizeListArray.from_arrays(pa.array(values.reshape(-1)), values.shape[1])
+        table = pa.table(arrays)
+        if self._writer is None:
+            metadata = {"agent_names": ",".join(self.agent_names)}
+            self._writer = pa.parquet.ParquetWriter(self.path, table.schema.with_metadata(metadata))
+        self._writer.write_table(table, row_group_size=count)
+
+    def close(self):
+        """Flush what is left and close the output"""
+        self.flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+def load_telemetry(path):
+    """
+    Read recorded telemetry back as a dict of NumPy arrays (agent columns as
+    (steps, agents) matrices) plus "agent_names"
+    """
+    if path.endswith(".parquet"):
+        pa = _parquet()
+        if pa is None:
+            raise ImportError("Reading Parquet telemetry requires pyarrow")
+        table = pa.parquet.read_table(path)
+        names = table.schema.metadata[b"agent_names"].decode().split(",")
+        data = {"agent_names": np.array(names)}
+        for name in table.column_names:
+            column = table.column(name).combine_chunks()
+            if name.startswith("agent_"):
+                data[name] = column.flatten().to_numpy().reshape(len(column), len(names))
+            else:
+                data[name] = column.to_numpy()
+        return data
+
+    files = sorted(glob.glob(f"{glob.escape(path)}-*.npz"))
+    if not files:
+        raise FileNotFoundError(f"No telemetry chunks found for {path}")
+    chunks = [np.load(f) for f in files]
+    data = {"agent_names": chunks[0]["agent_names"]}
+    for name in chunks[0].files:
+        if name != "agent_names":
+            data[name] = np.concatenate([chunk[name] for chunk in chunks])
+    return data
+
+
+def remove_telemetry(path):
+    """Delete a previous recording at path, so a new run does not mix with its chunks"""
+    for f in glob.glob(f"{glob.escape(path)}-*.npz"):
+        os.remove(f)
+    if path.endswith(".parquet") and os.path.exists(path):
+        os.remove(path)
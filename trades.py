@@ -0,0 +1,111 @@
+# Per-step trade clearing: offers are collected, validated in bulk, evaluated together and applied at once
+from collections import namedtuple
+import numpy as np
+from economic_agent import EconomicAgent
+from llm_dispatch import call_gemini_concurrently
+from llm_model import call_gemini
+from prompts import trade_instructions
+
+# How far (in cells, each axis) a trade target may be; matches Market.nearby_agents
+TRADE_RANGE = 2
+
+# Outcome of one offer. status is one of the TRADE_* values below; reason is the
+# target's explanation for accepted and rejected offers, otherwise None
+TradeResult = namedtuple("TradeResult", "sender target amount status reason")
+
+TRADE_ACCEPTED = "accepted"
+TRADE_REJECTED = "rejected"
+TRADE_NO_TARGET = "no target"  # Unknown name, dead, removed, or the sender itself
+TRADE_OUT_OF_RANGE = "out of range"
+TRADE_INSUFFICIENT = "insufficient energy"
+TRADE_WOULD_DIE = "would die"
+
+
+class TradeBook:
+    """
+    The trade offers made during one step. Offers are only recorded while agents
+    act; clear() then settles all of them at once:
+
+    1. targets are resolved by name through the agent store's O(1) index;
+    2. range and solvency are checked over NumPy arrays for every offer together;
+    3. targets evaluate the surviving offers, with the model calls sent concurrently
+       when max_concurrency allows more than one, otherwise one after another;
+    4. accepted transfers are applied in one pass, so no offer sees another's effect.
+
+    Each agent makes at most one decision per step, so a sender has at most one offer
+    and solvency checked before the transfers still holds after them.
+    """
+
+    def __init__(self):
+        self.senders = []
+        self.targets = []
+        self.amounts = []
+
+    def __len__(self):
+        return len(self.senders)
+
+    def submit(self, sender_id, target_name, amount):
+        self.senders.append(sender_id)
+        self.targets.append(target_name)
+        self.amounts.append(amount)
+
+    def clear(self, market, step, max_concurrency=1):
+        """Settle every pending offer against market and empty the book. Returns TradeResults in offer order"""
+        if not self.senders:
+            return []
+        store = market.store
+        senders = np.array(self.senders, dtype=np.int64)
+        amounts = np.array(self.amounts, dtype=np.int64)
+        names = self.targets
+        self.senders, self.targets, self.amounts = [], [], []
+
+        # Resolve targets; -1 marks a name no agent has
+        ids = [store.find(name) for name in names]
+        targets = np.array([-1 if i is None else i for i in ids], dtype=np.int64)
+        found = (targets >= 0) & (targets != senders)
+        t = np.where(found, targets, 0)
+        found &= store.active[t] & store.alive[t]
+
+        status = np.full(len(senders), TRADE_NO_TARGET, dtype=object)
+        in_range = (np.abs(store.x[t] - store.x[senders]) <= TRADE_RANGE) & \
+                   (np.abs(store.y[t] - store.y[senders]) <= TRADE_RANGE)
+        energy = store.energy[senders]
+        solvent = energy > amounts
+        survives = energy - amounts > store.loss[senders]
+        status[found & ~in_range] = TRADE_OUT_OF_RANGE
+        status[found & in_range & ~solvent] = TRADE_INSUFFICIENT
+        status[found & in_range & solvent & ~survives] = TRADE_WOULD_DIE
+        valid = np.flatnonzero(found & in_range & solvent & survives)
+
+        # Every valid offer goes to its target at once
+        offers, prompts = [], []
+        for k in valid.tolist():
+            sender = EconomicAgent.bind(store, int(senders[k]))
+            target = EconomicAgent.bind(store, int(targets[k]))
+            offer = {"type": "TRADE_OFFER", "amount": int(amounts[k]), "to": names[k]}
+            offers.append((k, sender, target, offer))
+            prompts.append(target.build_trade_prompt(offer, sender))
+        if max_concurrency > 1:
+            responses = call_gemini_concurrently(prompts, max_concurrency, trade_instructions())
+        else:
+            # No event loop or thread pool when calls go out one at a time anyway
+            responses = [call_gemini(prompt, trade_instructions()) for prompt in prompts]
+
+        reasons = {}
+        accepted = []
+        for (k, sender, target, offer), response in zip(offers, responses):
+            ok, reasons[k] = target.apply_trade_response(response, offer, sender)
+            status[k] = TRADE_ACCEPTED if ok else TRADE_REJECTED
+            if ok:
+                accepted.append(k)
+
+        # Apply every accepted transfer together; energy only moves between living agents
+        if accepted:
+            accepted = np.array(accepted)
+            np.add.at(store.energy, senders[accepted], -amounts[accepted])
+            np.add.at(store.energy, targets[accepted], amounts[accepted])
+            for k in accepted.tolist():
+                market.record_trade(step, store.name(int(senders[k])), names[k], int(amounts[k]))
+
+        return [TradeResult(store.name(int(s)), name, int(a), st, reasons.get(k))
+                for k, (s, name, a, st) in enumerate(zip(senders.tolist(), names, amounts.tolist(), status))]
@@ -2,6 +2,8 @@
 import pygame
 import time
 import numpy as np
+from collections import OrderedDict
+from itertools import islice
 
 # Define colors
 BACKGROUND = (240, 240, 240)
@@ -17,190 +19,448 @@ AGENT_COLORS = {
 }
 DEAD_AGENT_COLOR = (80, 80, 80)    # Gray for dead agents
 TEXT_COLOR = (10, 10, 10)
+OUTSIDE_COLOR = (170, 170, 170)    # Viewport area beyond the board edge
+
+# Largest grid viewport in pixels; bigger boards are seen through a pannable camera
+MAX_VIEW_WIDTH = 960
+MAX_VIEW_HEIGHT = 720
+
+# Level of detail by cell size in pixels: labels are dropped below DETAIL_CELL_SIZE,
+# and below LOD_CELL_SIZE the board is drawn as one food-density image
+DETAIL_CELL_SIZE = 30
+LOD_CELL_SIZE = 8
+MAX_CELL_SIZE = 120
+
+# Density image palette: DENSITY_LEVELS shades from the background to green food,
+# then the same for red food. Cells reach full colour at DENSITY_FULL_ENERGY.
+DENSITY_LEVELS = 16
+DENSITY_MIN_LEVEL = 5
+DENSITY_FULL_ENERGY = 100
+_shade = np.linspace(0.0, 1.0, DENSITY_LEVELS)[:, None]
+DENSITY_PALETTE = np.concatenate([
+    np.asarray(BACKGROUND) + (np.asarray(GREEN_FOOD_COLOR) - np.asarray(BACKGROUND)) * _shade,
+    np.asarray(BACKGROUND) + (np.asarray(RED_FOOD_COLOR) - np.asarray(BACKGROUND)) * _shade,
+]).astype(np.uint8)
+
+
+def agent_palette(personas):
+    """Colour per persona code, with dead agents' colour after the last code"""
+    return np.array([AGENT_COLORS.get(p, (150, 150, 150)) for p in personas] + [DEAD_AGENT_COLOR],
+                    dtype=np.uint8)
+
+
+def changed_agent_cells(previous, current):
+    """
+    Cells (xs, ys) whose agents differ between two AgentColumns: the old and the new
+    cell of every agent that moved, died, or changed persona, energy or name, and the
+    cells of agents that came or went
+    """
+    if len(previous) == len(current) and np.array_equal(previous.ids, current.ids):
+        prev_rows = cur_rows = np.arange(len(current))
+    else:
+        _, prev_rows, cur_rows = np.intersect1d(previous.ids, current.ids, assume_unique=True,
+                                                return_indices=True)
+    same = ((previous.x[prev_rows] == current.x[cur_rows]) & (previous.y[prev_rows] == current.y[cur_rows])
+            & (previous.alive[prev_rows] == current.alive[cur_rows])
+            & (previous.persona[prev_rows] == current.persona[cur_rows])
+            & (previous.energy[prev_rows] == current.energy[cur_rows]))
+    if previous.custom_names != current.custom_names:
+        renamed = [i for i in previous.custom_names.keys() | current.custom_names.keys()
+                   if previous.custom_names.get(i) != current.custom_names.get(i)]
+        same &= ~np.isin(current.ids[cur_rows], renamed)
+    stale = np.ones(len(previous), dtype=bool)
+    stale[prev_rows[same]] = False
+    fresh = np.ones(len(current), dtype=bool)
+    fresh[cur_rows[same]] = False
+    return (np.concatenate([previous.x[stale], current.x[fresh]]),
+            np.concatenate([previous.y[stale], current.y[fresh]]))
+
+
+# Camera controls handled inside Visualization.check_events
+CAMERA_KEYS = {
+    pygame.K_w: lambda vis: vis.pan(0, -1),
+    pygame.K_s: lambda vis: vis.pan(0, 1),
+    pygame.K_a: lambda vis: vis.pan(-1, 0),
+    pygame.K_d: lambda vis: vis.pan(1, 0),
+    pygame.K_EQUALS: lambda vis: vis.zoom(1.25),
+    pygame.K_PLUS: lambda vis: vis.zoom(1.25),
+    pygame.K_KP_PLUS: lambda vis: vis.zoom(1.25),
+    pygame.K_MINUS: lambda vis: vis.zoom(0.8),
+    pygame.K_KP_MINUS: lambda vis: vis.zoom(0.8),
+}
+
+
+class FrameMismatchError(RuntimeError):
+    """Raised when an incrementally drawn frame differs from a full redraw of the same state"""
+
+
+class TextCache:
+    """LRU cache of rendered text surfaces keyed by (text, font, colour)"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._surfaces = OrderedDict()
+
+    def render(self, font, text, color):
+        key = (text, font, color)
+        surface = self._surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self._surfaces.move_to_end(key)
+            return surface
+
+        self.misses += 1
+        surface = font.render(text, True, color)
+        self._surfaces[key] = surface
+        if len(self._surfaces) > self.max_entries:
+            self._surfaces.popitem(last=False)
+        return surface
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self._surfaces),
+        }
+
 
 class Visualization:
-    def __init__(self, width=9, height=9, cell_size=60):
-        pygame.init()
+    def __init__(self, width=9, height=9, cell_size=60, profiler=None, check_frames=False):
+        # Only the subsystems drawing needs; audio, joysticks and the rest stay off
+        pygame.display.init()
+        pygame.font.init()
+        
+        # Optional PhaseProfiler whose step timings get a panel of their own
+        self.profiler = profiler
         
         self.width = width
         self.height = height
-        self.cell_size = cell_size
+        # Shrink cells so the whole board fits the largest viewport where possible
+        self.cell_size = max(1, min(cell_size, MAX_VIEW_WIDTH // width, MAX_VIEW_HEIGHT // height))
+        
+        # The grid viewport keeps its pixel size; panning and zooming change what it shows
+        self.view_width = min(width * self.cell_size, MAX_VIEW_WIDTH)
+        self.view_height = min(height * self.cell_size, MAX_VIEW_HEIGHT)
+        self.view_rect = pygame.Rect(0, 0, self.view_width + 1, self.view_height + 1)
+        # Where single cells may be redrawn: the viewport without its bottom row, which
+        # holds the separator line (a zoomed view can end in a partly visible row of cells)
+        self.cells_rect = pygame.Rect(0, 0, self.view_width + 1, self.view_height)
+        self.camera_x = 0  # Top-left visible cell
+        self.camera_y = 0
         
         # Calculate window size with extra space for energy info and trade dialog
-        screen_width = width * cell_size + 1
-        screen_height = height * cell_size + 251  # Extra 250px for info panels
+        screen_width = self.view_width + 1
+        screen_height = self.view_height + 251  # Extra 250px for info panels
+        if profiler is not None:
+            screen_height += 125
         
         # Create the display
         self.screen = pygame.display.set_mode((screen_width, screen_height))
         pygame.display.set_caption("Energy-Based Economic Agent Simulation")
         
-        # Set up fonts
-        self.font = pygame.font.SysFont('Arial', 12)
-        self.title_font = pygame.font.SysFont('Arial', 16, bold=True)
+        # Fonts are looked up on first use (see font and title_font); SysFont scans system fonts
+        self._font = None
+        self._title_font = None
+        self.text_cache = TextCache()
         
         # Info panels
-        self.trade_dialog_rect = pygame.Rect(0, height * cell_size + 1, screen_width // 2, 125)
-        self.energy_info_rect = pygame.Rect(screen_width // 2, height * cell_size + 1, screen_width // 2, 125)
-        self.system_info_rect = pygame.Rect(0, height * cell_size + 126, screen_width, 125)
+        self.trade_dialog_rect = pygame.Rect(0, self.view_height + 1, screen_width // 2, 125)
+        self.energy_info_rect = pygame.Rect(screen_width // 2, self.view_height + 1, screen_width - screen_width // 2, 125)
+        self.system_info_rect = pygame.Rect(0, self.view_height + 126, screen_width, 125)
+        self.profile_rect = pygame.Rect(0, self.view_height + 251, screen_width, 125)
+        
+        # Static grid (background + lines) for the current camera, rebuilt only when it moves
+        self.background = self.build_background()
+        
+        # What was on screen last frame, used to find the cells and panels that changed
+        self._prev_food = None
+        self._prev_columns = None
+        self._panel_keys = {}
+        self._full_redraw = True
+        # Debug: compare every incremental frame with a full redraw (see verify_frame)
+        self.check_frames = check_frames
+        
+    @property
+    def font(self):
+        if self._font is None:
+            self._font = pygame.font.SysFont('Arial', 12)
+        return self._font
+    
+    @property
+    def title_font(self):
+        if self._title_font is None:
+            self._title_font = pygame.font.SysFont('Arial', 16, bold=True)
+        return self._title_font
+    
+    def render_text(self, text, color, font=None):
+        """Render text through the shared surface cache (antialiased, like every label here)"""
+        return self.text_cache.render(font or self.font, text, color)
+    
+    def visible_bounds(self):
+        """Board cells in view as (x0, x1, y0, y1), end-exclusive"""
+        cols = -(-self.view_width // self.cell_size)
+        rows = -(-self.view_height // self.cell_size)
+        return (self.camera_x, min(self.width, self.camera_x + cols),
+                self.camera_y, min(self.height, self.camera_y + rows))
+    
+    def visible_agents(self, columns):
+        """Rows of columns (AgentColumns) whose agents are in view, in id order"""
+        x0, x1, y0, y1 = self.visible_bounds()
+        return np.flatnonzero((columns.x >= x0) & (columns.x < x1) & (columns.y >= y0) & (columns.y < y1))
+    
+    def cell_origin(self, x, y):
+        """Screen position of a cell's top-left corner"""
+        return (x - self.camera_x) * self.cell_size, (y - self.camera_y) * self.cell_size
+    
+    def build_background(self):
+        background = pygame.Surface(self.view_rect.size)
+        background.fill(OUTSIDE_COLOR)
         
-    def draw_grid(self, market):
-        self.screen.fill(BACKGROUND)
+        x0, x1, y0, y1 = self.visible_bounds()
+        left, top = self.cell_origin(x0, y0)
+        right, bottom = self.cell_origin(x1, y1)
+        background.fill(BACKGROUND, pygame.Rect(left, top, right - left + 1, bottom - top + 1))
+        if self.cell_size < LOD_CELL_SIZE:
+            return background
         
         # Draw grid lines
-        for x in range(self.width + 1):
+        for x in range(x0, x1 + 1):
             pygame.draw.line(
-                self.screen, 
+                background, 
                 GRID_LINE, 
-                (x * self.cell_size, 0), 
-                (x * self.cell_size, self.height * self.cell_size)
+                (left + (x - x0) * self.cell_size, top), 
+                (left + (x - x0) * self.cell_size, bottom)
             )
         
-        for y in range(self.height + 1):
+        for y in range(y0, y1 + 1):
             pygame.draw.line(
-                self.screen, 
+                background, 
                 GRID_LINE, 
-                (0, y * self.cell_size), 
-                (self.width * self.cell_size, y * self.cell_size)
+                (left, top + (y - y0) * self.cell_size), 
+                (right, top + (y - y0) * self.cell_size)
             )
+        return background
+    
+    def move_camera(self, camera_x, camera_y, cell_size=None):
+        """Pan/zoom the viewport, keeping it on the board; forces a full redraw"""
+        if cell_size is not None:
+            self.cell_size = max(1, min(MAX_CELL_SIZE, cell_size))
+        cols = self.view_width // self.cell_size
+        rows = self.view_height // self.cell_size
+        self.camera_x = max(0, min(camera_x, self.width - cols))
+        self.camera_y = max(0, min(camera_y, self.height - rows))
+        self.background = self.build_background()
+        self.invalidate()
+    
+    def pan(self, dx, dy):
+        # Move a quarter of the view per key press
+        cols = max(1, self.view_width // self.cell_size // 4)
+        rows = max(1, self.view_height // self.cell_size // 4)
+        self.move_camera(self.camera_x + dx * cols, self.camera_y + dy * rows)
+    
+    def zoom(self, factor):
+        # Zoom around the centre of the view
+        center_x = self.camera_x + self.view_width / self.cell_size / 2
+        center_y = self.camera_y + self.view_height / self.cell_size / 2
+        cell_size = max(1, min(MAX_CELL_SIZE, round(self.cell_size * factor)))
+        if cell_size == self.cell_size:
+            cell_size += 1 if factor > 1 else -1
+        cell_size = max(1, min(MAX_CELL_SIZE, cell_size))
+        self.move_camera(int(center_x - self.view_width / cell_size / 2),
+                         int(center_y - self.view_height / cell_size / 2), cell_size)
+    
+    def draw_grid(self, market, columns):
+        self.screen.set_clip(self.view_rect)
+        self.screen.blit(self.background, (0, 0))
         
-        # Draw red and green food
-        for y in range(self.height):
-            for x in range(self.width):
-                center_x = x * self.cell_size + self.cell_size // 2
-                center_y = y * self.cell_size + self.cell_size // 2
-                
-                # Draw red food (50 energy each)
-                red_food = market.grid[y][x]["red_food"]
-                if red_food > 0:
-                    # Larger circles for red food (higher energy)
-                    radius = min(8 + (red_food * 3), self.cell_size // 3)
-                    pygame.draw.circle(self.screen, RED_FOOD_COLOR, 
-                                     (center_x - 8, center_y - 8), radius)
-                    # Show count if multiple
-                    if red_food > 1:
-                        count_text = self.font.render(str(red_food), True, (255, 255, 255))
-                        self.screen.blit(count_text, (center_x - 15, center_y - 15))
-                
-                # Draw green food (5 energy each)
-                green_food = market.grid[y][x]["green_food"]
-                if green_food > 0:
-                    # Smaller circles for green food (lower energy)
-                    radius = min(4 + (green_food * 2), self.cell_size // 4)
-                    pygame.draw.circle(self.screen, GREEN_FOOD_COLOR, 
-                                     (center_x + 8, center_y + 8), radius)
-                    # Show count if multiple
-                    if green_food > 1:
-                        count_text = self.font.render(str(green_food), True, (255, 255, 255))
-                        self.screen.blit(count_text, (center_x + 5, center_y + 5))
-    
-    def draw_agents(self, agents):
-        for agent in agents:
-            x, y = agent.position
-            
-            # Calculate center of cell
-            center_x = x * self.cell_size + self.cell_size // 2
-            center_y = y * self.cell_size + self.cell_size // 2
-            
-            # Choose color based on alive status
-            if agent.is_alive:
-                color = AGENT_COLORS.get(agent.persona, (150, 150, 150))
-            else:
-                color = DEAD_AGENT_COLOR
-            
-            # Draw agent as colored circle
-            pygame.draw.circle(self.screen, color, (center_x, center_y), self.cell_size // 3)
-            
-            # Draw agent name
-            text = self.font.render(agent.name.split('_')[1], True, TEXT_COLOR)
-            text_rect = text.get_rect(center=(center_x, center_y - self.cell_size // 4))
-            self.screen.blit(text, text_rect)
-            
-            # Draw energy amount (or DEAD)
-            if agent.is_alive:
-                energy_text = self.font.render(f"E:{agent.energy}", True, TEXT_COLOR)
-                # Color code energy level
-                if agent.energy <= 10:
-                    energy_color = (255, 0, 0)  # Red for low energy
-                elif agent.energy <= 25:
-                    energy_color = (255, 165, 0)  # Orange for medium energy
-                else:
-                    energy_color = (0, 150, 0)  # Green for high energy
-                energy_text = self.font.render(f"E:{agent.energy}", True, energy_color)
+        if self.cell_size < LOD_CELL_SIZE:
+            self.draw_density(market, columns)
+        else:
+            # Draw red and green food (only visible cells that hold any)
+            x0, x1, y0, y1 = self.visible_bounds()
+            red = market.red_food[y0:y1, x0:x1]
+            green = market.green_food[y0:y1, x0:x1]
+            ys, xs = np.nonzero(red | green)
+            for y, x, red_food, green_food in zip(ys.tolist(), xs.tolist(),
+                                                  red[ys, xs].tolist(), green[ys, xs].tolist()):
+                self.screen.set_clip(self.cell_interior(x + x0, y + y0))
+                self.draw_food(x + x0, y + y0, red_food, green_food)
+        self.screen.set_clip(None)
+        # Separator under the viewport; its row is part of view_rect, so it goes with the grid
+        pygame.draw.line(self.screen, GRID_LINE, (0, self.view_height), (self.view_width, self.view_height))
+    
+    def draw_density(self, market, columns):
+        """Low-zoom view: food density and agents as one image, scaled up to the cell size"""
+        x0, x1, y0, y1 = self.visible_bounds()
+        # Work on contiguous [y][x] rows; the finished image is transposed into surfarray's [x][y] order
+        red = market.red_food[y0:y1, x0:x1]
+        green = market.green_food[y0:y1, x0:x1]
+        
+        # Shade level by cell energy, offset into the red half of the palette where red food is
+        energy = red * 50 + green * 5
+        level = np.minimum(energy, DENSITY_FULL_ENERGY) * (DENSITY_LEVELS - 1) // DENSITY_FULL_ENERGY
+        np.maximum(level, np.where(energy > 0, DENSITY_MIN_LEVEL, 0), out=level)
+        level += np.where(red > 0, DENSITY_LEVELS, 0)
+        image = DENSITY_PALETTE.take(level, axis=0)
+        
+        # One pixel per visible agent, written in a single fancy-indexed assignment
+        visible = self.visible_agents(columns)
+        if len(visible):
+            codes = np.where(columns.alive[visible], columns.persona[visible], len(columns.personas))
+            image[columns.y[visible] - y0, columns.x[visible] - x0] = agent_palette(columns.personas)[codes]
+        
+        surface = pygame.surfarray.make_surface(image.transpose(1, 0, 2))
+        size = ((x1 - x0) * self.cell_size, (y1 - y0) * self.cell_size)
+        self.screen.blit(pygame.transform.scale(surface, size), (0, 0))
+    
+    def draw_food(self, x, y, red_food, green_food):
+        left, top = self.cell_origin(x, y)
+        center_x = left + self.cell_size // 2
+        center_y = top + self.cell_size // 2
+        # Offsets scale with zoom (8px and 15px at the default 60px cells)
+        offset = self.cell_size * 2 // 15
+        label_offset = self.cell_size // 4
+        show_labels = self.cell_size >= DETAIL_CELL_SIZE
+
+        # Draw red food (50 energy each)
+        if red_food > 0:
+            # Larger circles for red food (higher energy)
+            radius = min(8 + (red_food * 3), self.cell_size // 3)
+            pygame.draw.circle(self.screen, RED_FOOD_COLOR, 
+                             (center_x - offset, center_y - offset), radius)
+            # Show count if multiple
+            if red_food > 1 and show_labels:
+                count_text = self.render_text(str(red_food), (255, 255, 255))
+                self.screen.blit(count_text, (center_x - label_offset, center_y - label_offset))
+
+        # Draw green food (5 energy each)
+        if green_food > 0:
+            # Smaller circles for green food (lower energy)
+            radius = min(4 + (green_food * 2), self.cell_size // 4)
+            pygame.draw.circle(self.screen, GREEN_FOOD_COLOR, 
+                             (center_x + offset, center_y + offset), radius)
+            # Show count if multiple
+            if green_food > 1 and show_labels:
+                count_text = self.render_text(str(green_food), (255, 255, 255))
+                self.screen.blit(count_text, (center_x + 5 * offset // 8, center_y + 5 * offset // 8))
+    
+    def draw_agents(self, columns):
+        # At low zoom agents are part of the density image
+        if self.cell_size < LOD_CELL_SIZE:
+            return
+        for i in self.visible_agents(columns).tolist():
+            self.screen.set_clip(self.cell_interior(int(columns.x[i]), int(columns.y[i])))
+            self.draw_agent(columns, i)
+        self.screen.set_clip(None)
+    
+    def draw_agent(self, columns, i):
+        """Draw the agent in row i of columns (AgentColumns)"""
+        # Calculate center of cell
+        left, top = self.cell_origin(int(columns.x[i]), int(columns.y[i]))
+        center_x = left + self.cell_size // 2
+        center_y = top + self.cell_size // 2
+        
+        # Choose color based on alive status
+        is_alive = bool(columns.alive[i])
+        if is_alive:
+            color = AGENT_COLORS.get(columns.personas[columns.persona[i]], (150, 150, 150))
+        else:
+            color = DEAD_AGENT_COLOR
+        
+        # Draw agent as colored circle
+        pygame.draw.circle(self.screen, color, (center_x, center_y), max(1, self.cell_size // 3))
+        if self.cell_size < DETAIL_CELL_SIZE:
+            return
+        
+        # Draw agent name
+        text = self.render_text(columns.name(int(columns.ids[i])).split('_')[1], TEXT_COLOR)
+        text_rect = text.get_rect(center=(center_x, center_y - self.cell_size // 4))
+        self.screen.blit(text, text_rect)
+        
+        # Draw energy amount (or DEAD)
+        if is_alive:
+            energy = int(columns.energy[i])
+            # Color code energy level
+            if energy <= 10:
+                energy_color = (255, 0, 0)  # Red for low energy
+            elif energy <= 25:
+                energy_color = (255, 165, 0)  # Orange for medium energy
             else:
-                energy_text = self.font.render("DEAD", True, (255, 0, 0))
-            
-            energy_rect = energy_text.get_rect(center=(center_x, center_y + self.cell_size // 6))
-            self.screen.blit(energy_text, energy_rect)
+                energy_color = (0, 150, 0)  # Green for high energy
+            energy_text = self.render_text(f"E:{energy}", energy_color)
+        else:
+            energy_text = self.render_text("DEAD", (255, 0, 0))
+        
+        energy_rect = energy_text.get_rect(center=(center_x, center_y + self.cell_size // 6))
+        self.screen.blit(energy_text, energy_rect)
     
-    def draw_trade_dialog(self, agents):
+    def draw_trade_dialog(self, columns):
         # Clear trade dialog area
         pygame.draw.rect(self.screen, (220, 220, 220), self.trade_dialog_rect)
-        pygame.draw.line(self.screen, GRID_LINE, 
-                          (0, self.height * self.cell_size), 
-                          (self.width * self.cell_size, self.height * self.cell_size))
         
         # Draw title
-        title = self.title_font.render("Recent Trades", True, TEXT_COLOR)
-        self.screen.blit(title, (10, self.height * self.cell_size + 5))
+        title = self.render_text("Recent Trades", TEXT_COLOR, self.title_font)
+        self.screen.blit(title, (10, self.view_height + 5))
         
         # Track recent trades
-        y_pos = self.height * self.cell_size + 25
-        trades_shown = 0
-        
-        for agent in agents:
-            if agent.latest_trade and trades_shown < 3:  # Show up to 3 recent trades
-                trade = agent.latest_trade
-                status = "ACCEPTED" if trade["accepted"] else "REJECTED"
-                color = (0, 130, 0) if trade["accepted"] else (180, 0, 0)
-                
-                trade_text = f"{trade['from']} → {agent.name}: {trade['amount']}E"
-                reason_text = f"{status}: {trade['reason'][:20]}..." if len(trade['reason']) > 20 else f"{status}: {trade['reason']}"
-                
-                text1 = self.font.render(trade_text, True, TEXT_COLOR)
-                text2 = self.font.render(reason_text, True, color)
-                
-                self.screen.blit(text1, (10, y_pos))
-                self.screen.blit(text2, (10, y_pos + 12))
-                
-                y_pos += 30
-                trades_shown += 1
-    
-    def draw_energy_info(self, market):
+        y_pos = self.view_height + 25
+        
+        for i, trade in islice(columns.latest_trade.items(), 3):  # Show up to 3 recent trades
+            status = "ACCEPTED" if trade["accepted"] else "REJECTED"
+            color = (0, 130, 0) if trade["accepted"] else (180, 0, 0)
+            
+            trade_text = f"{trade['from']} → {columns.name(i)}: {trade['amount']}E"
+            reason_text = f"{status}: {trade['reason'][:20]}..." if len(trade['reason']) > 20 else f"{status}: {trade['reason']}"
+            
+            text1 = self.render_text(trade_text, TEXT_COLOR)
+            text2 = self.render_text(reason_text, color)
+            
+            self.screen.blit(text1, (10, y_pos))
+            self.screen.blit(text2, (10, y_pos + 12))
+            
+            y_pos += 30
+    
+    def draw_energy_info(self, columns):
         # Clear energy info area
         pygame.draw.rect(self.screen, (240, 240, 255), self.energy_info_rect)
         
         # Draw title
-        title = self.title_font.render("Energy Status", True, TEXT_COLOR)
-        x_pos = self.width * self.cell_size // 2 + 10
-        self.screen.blit(title, (x_pos, self.height * self.cell_size + 5))
+        title = self.render_text("Energy Status", TEXT_COLOR, self.title_font)
+        x_pos = self.view_width // 2 + 10
+        self.screen.blit(title, (x_pos, self.view_height + 5))
         
         # Show living agents and their energy
-        y_pos = self.height * self.cell_size + 25
-        alive_agents = [a for a in market.agents if a.is_alive]
+        y_pos = self.view_height + 25
+        living = np.flatnonzero(columns.alive)
         
-        for i, agent in enumerate(alive_agents[:4]):  # Show up to 4 agents
-            energy_color = (0, 150, 0) if agent.energy > 25 else (255, 165, 0) if agent.energy > 10 else (255, 0, 0)
-            agent_text = f"{agent.name}: {agent.energy}E"
-            text = self.font.render(agent_text, True, energy_color)
+        for i, row in enumerate(living[:4].tolist()):  # Show up to 4 agents
+            energy = int(columns.energy[row])
+            energy_color = (0, 150, 0) if energy > 25 else (255, 165, 0) if energy > 10 else (255, 0, 0)
+            agent_text = f"{columns.name(int(columns.ids[row]))}: {energy}E"
+            text = self.render_text(agent_text, energy_color)
             self.screen.blit(text, (x_pos, y_pos + i * 15))
         
         # Population count
-        pop_text = f"Population: {len(alive_agents)}"
-        pop_surface = self.font.render(pop_text, True, TEXT_COLOR)
+        pop_text = f"Population: {len(living)}"
+        pop_surface = self.render_text(pop_text, TEXT_COLOR)
         self.screen.blit(pop_surface, (x_pos, y_pos + 75))
     
-    def draw_system_info(self, market):
+    def draw_system_info(self, market, columns):
         # Clear system info area
         pygame.draw.rect(self.screen, (255, 240, 240), self.system_info_rect)
         
         # Draw title
-        title = self.title_font.render("System Energy", True, TEXT_COLOR)
-        self.screen.blit(title, (10, self.height * self.cell_size + 131))
+        title = self.render_text("System Energy", TEXT_COLOR, self.title_font)
+        self.screen.blit(title, (10, self.view_height + 131))
         
         # Calculate energy distribution
         agent_energy, food_energy, total_energy = market.get_total_system_energy()
         
-        y_pos = self.height * self.cell_size + 151
+        y_pos = self.view_height + 151
         
         # Energy breakdown
         agent_text = f"Agent Energy: {agent_energy}"
@@ -208,13 +468,13 @@ class Visualization:
         total_text = f"Total System Energy: {total_energy}"
         input_text = f"Energy Input/Turn: {market.total_energy_added_per_turn}"
         
-        self.screen.blit(self.font.render(agent_text, True, TEXT_COLOR), (10, y_pos))
-        self.screen.blit(self.font.render(food_text, True, TEXT_COLOR), (10, y_pos + 15))
-        self.screen.blit(self.font.render(total_text, True, TEXT_COLOR), (10, y_pos + 30))
-        self.screen.blit(self.font.render(input_text, True, TEXT_COLOR), (10, y_pos + 45))
+        self.screen.blit(self.render_text(agent_text, TEXT_COLOR), (10, y_pos))
+        self.screen.blit(self.render_text(food_text, TEXT_COLOR), (10, y_pos + 15))
+        self.screen.blit(self.render_text(total_text, TEXT_COLOR), (10, y_pos + 30))
+        self.screen.blit(self.render_text(input_text, TEXT_COLOR), (10, y_pos + 45))
         
         # Energy loss calculation
-        alive_agents = len([a for a in market.agents if a.is_alive])
+        alive_agents = int(np.count_nonzero(columns.alive))
         total_loss = alive_agents * 2  # Assuming 2 energy loss per agent per turn
         net_energy = market.total_energy_added_per_turn - total_loss
         
@@ -222,23 +482,171 @@ class Visualization:
         net_text = f"Net Energy/Turn: {net_energy:+d}"
         net_color = (0, 150, 0) if net_energy >= 0 else (255, 0, 0)
         
-        x_pos2 = self.width * self.cell_size // 2 + 10
-        self.screen.blit(self.font.render(loss_text, True, TEXT_COLOR), (x_pos2, y_pos))
-        self.screen.blit(self.font.render(net_text, True, net_color), (x_pos2, y_pos + 15))
+        x_pos2 = self.view_width // 2 + 10
+        self.screen.blit(self.render_text(loss_text, TEXT_COLOR), (x_pos2, y_pos))
+        self.screen.blit(self.render_text(net_text, net_color), (x_pos2, y_pos + 15))
+    
+    def draw_profile(self):
+        """Rolling p50/p95/p99 of each step phase, in two columns, slowest first"""
+        pygame.draw.rect(self.screen, (240, 255, 240), self.profile_rect)
+        top = self.profile_rect.top
+        title = self.render_text("Step Profile (ms p50 / p95 / p99)", TEXT_COLOR, self.title_font)
+        self.screen.blit(title, (10, top + 5))
+        
+        summary = self.profiler.summary()
+        phases = sorted(summary, key=lambda p: (p != "step", -summary[p]["p50"]))
+        column_width = self.profile_rect.width // 2
+        for i, phase in enumerate(phases[:12]):
+            stats = summary[phase]
+            text = f"{phase}: {stats['p50']:.2f} / {stats['p95']:.2f} / {stats['p99']:.2f}"
+            x_pos = 10 + (i // 6) * column_width
+            y_pos = top + 25 + (i % 6) * 15
+            self.screen.blit(self.render_text(text, TEXT_COLOR), (x_pos, y_pos))
+    
+    def cell_rect(self, x, y):
+        # Includes the grid lines on all four sides of the cell, cut to the viewport
+        left, top = self.cell_origin(x, y)
+        return pygame.Rect(left, top, self.cell_size + 1, self.cell_size + 1).clip(self.cells_rect)
+    
+    def cell_interior(self, x, y):
+        """
+        The cell without its grid lines, which is what food and agents are clipped to.
+        Neighbouring cells share their lines, so nothing drawn on one could survive a
+        redraw of its neighbour as it would a full redraw.
+        """
+        left, top = self.cell_origin(x, y)
+        return pygame.Rect(left + 1, top + 1, self.cell_size - 1, self.cell_size - 1).clip(self.cells_rect)
+    
+    def redraw_cell(self, market, columns, x, y, rows):
+        """Redraw one cell from the cached background, then its food and the agents in rows of columns"""
+        rect = self.cell_rect(x, y)
+        self.screen.blit(self.background, rect, rect)
+        self.screen.set_clip(self.cell_interior(x, y))
+        self.draw_food(x, y, int(market.red_food[y, x]), int(market.green_food[y, x]))
+        for i in rows:
+            self.draw_agent(columns, i)
+        self.screen.set_clip(None)
+        return rect
+    
+    def panel_keys(self, market, columns):
+        """Everything each info panel shows; a panel is redrawn only when its key changes"""
+        living = np.flatnonzero(columns.alive)
+        trades = tuple(
+            (columns.name(i), trade["from"], trade["amount"], trade["accepted"], trade["reason"])
+            for i, trade in islice(columns.latest_trade.items(), 3)
+        )
+        return {
+            # Step timings only change when the simulation finishes a step
+            "profile": self.profiler.steps if self.profiler is not None else None,
+            "trade": trades,
+            "energy": (tuple((columns.name(int(columns.ids[i])), int(columns.energy[i]))
+                              for i in living[:4].tolist()), len(living)),
+            "system": (market.get_total_system_energy(), market.total_energy_added_per_turn, len(living)),
+        }
+    
+    def invalidate(self):
+        """Force a full redraw on the next update"""
+        self._full_redraw = True
+    
+    def verify_frame(self, market):
+        """
+        Redraw market in full and compare it with what is on screen. Raises
+        FrameMismatchError if any pixel differs, i.e. the incremental update missed something.
+        """
+        frame = pygame.surfarray.array3d(self.screen)
+        self.invalidate()
+        self._update(market)
+        differs = (frame != pygame.surfarray.array3d(self.screen)).any(axis=2)
+        if differs.any():
+            xs, ys = np.nonzero(differs)
+            raise FrameMismatchError(
+                f"{len(xs)} pixels differ from a full redraw, within x {xs.min()}-{xs.max()}, "
+                f"y {ys.min()}-{ys.max()} (cell size {self.cell_size})"
+            )
     
     def update(self, market):
-        self.draw_grid(market)
-        self.draw_agents(market.agents)
-        self.draw_trade_dialog(market.agents)
-        self.draw_energy_info(market)
-        self.draw_system_info(market)
-        pygame.display.flip()
+        full_redraw = self._full_redraw
+        self._update(market)
+        if self.check_frames and not full_redraw:
+            self.verify_frame(market)
+    
+    def _update(self, market):
+        # Agents come as array columns (market.agent_columns()), diffed against last frame's
+        columns = market.agent_columns()
+        x0, x1, y0, y1 = self.visible_bounds()
+        panel_keys = self.panel_keys(market, columns)
+        food = market.food[:, y0:y1, x0:x1]
+        
+        if self._full_redraw or self._prev_food is None or self._prev_food.shape != food.shape:
+            self.screen.fill(BACKGROUND)
+            self.draw_grid(market, columns)
+            self.draw_agents(columns)
+            self.draw_trade_dialog(columns)
+            self.draw_energy_info(columns)
+            self.draw_system_info(market, columns)
+            if self.profiler is not None:
+                self.draw_profile()
+            pygame.display.flip()
+            self._full_redraw = False
+        else:
+            # Visible cells whose food or agents changed since the last frame
+            dirty = (food != self._prev_food).any(axis=0)
+            xs, ys = changed_agent_cells(self._prev_columns, columns)
+            inside = (xs >= x0) & (xs < x1) & (ys >= y0) & (ys < y1)
+            dirty[ys[inside] - y0, xs[inside] - x0] = True
+            
+            ys, xs = np.nonzero(dirty)
+            if not len(xs):
+                dirty_rects = []
+            elif self.cell_size < LOD_CELL_SIZE or len(xs) * 4 > dirty.size:
+                # The density image is redrawn as a whole, which is a single blit. So is a
+                # view where most cells changed: one pass beats redrawing them cell by cell
+                self.draw_grid(market, columns)
+                self.draw_agents(columns)
+                dirty_rects = [self.view_rect]
+            else:
+                # Group the visible agents standing in dirty cells by cell
+                visible = self.visible_agents(columns)
+                visible = visible[dirty[columns.y[visible] - y0, columns.x[visible] - x0]]
+                rows_by_cell = {}
+                for i, x, y in zip(visible.tolist(), columns.x[visible].tolist(), columns.y[visible].tolist()):
+                    rows_by_cell.setdefault((x, y), []).append(i)
+                dirty_rects = [self.redraw_cell(market, columns, x, y, rows_by_cell.get((x, y), ()))
+                               for x, y in zip((xs + x0).tolist(), (ys + y0).tolist())]
+            
+            panels = [
+                ("trade", self.trade_dialog_rect, lambda: self.draw_trade_dialog(columns)),
+                ("energy", self.energy_info_rect, lambda: self.draw_energy_info(columns)),
+                ("system", self.system_info_rect, lambda: self.draw_system_info(market, columns)),
+            ]
+            if self.profiler is not None:
+                panels.append(("profile", self.profile_rect, self.draw_profile))
+            for name, rect, draw in panels:
+                if panel_keys[name] != self._panel_keys.get(name):
+                    draw()
+                    dirty_rects.append(rect)
+            
+            if dirty_rects:
+                pygame.display.update(dirty_rects)
+        
+        self._prev_food = food.copy()
+        self._prev_columns = columns
+        self._panel_keys = panel_keys
     
     def check_events(self):
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 return False, None
+            if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                # The window contents were lost, so the next frame must be complete
+                self.invalidate()
+            if event.type == pygame.MOUSEWHEEL and event.y:
+                self.zoom(1.25 if event.y > 0 else 0.8)
             if event.type == pygame.KEYDOWN:
+                # Camera: WASD to pan, +/- to zoom
+                if event.key in CAMERA_KEYS:
+                    CAMERA_KEYS[event.key](self)
+                    continue
                 if event.key == pygame.K_ESCAPE:
                     return False, None
                 if event.key == pygame.K_SPACE: